@@ -1 +1,4 @@
+import time
 
+# When the package was first imported, from which the app reports how long it took to start serving.
+IMPORTED_AT = time.perf_counter()
@@ -1,11 +1,248 @@
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import os
+import signal
+import socket
 import subprocess
 import sys
+import tempfile
+import time
+from collections.abc import Callable
+from multiprocessing.synchronize import Event
+from pathlib import Path
+
+import aiosqlite
+import uvicorn
+from starlette.config import Config
+
+logger = logging.getLogger("simple_web_app.launcher")
+
+APP = "simple_web_app.app:app"
+
+# uvicorn's own processes use the spawn start method, so that workers don't inherit the parent's event loop or threads.
+spawn = multiprocessing.get_context("spawn")
+
+
+class WorkerServer(uvicorn.Server):
+    """
+    uvicorn Server which signals the supervisor once it has started accepting connections.
+    """
+    def __init__(self, config: uvicorn.Config, ready: Event):
+        super().__init__(config)
+        self.ready = ready
+
+    async def startup(self, sockets: list[socket.socket] | None = None) -> None:
+        await super().startup(sockets)
+        if self.started:
+            self.ready.set()
+
+
+def run_worker(config: uvicorn.Config, sockets: list[socket.socket], ready: Event, run_maintenance: bool) -> None:
+    # Read by the app module, which is only imported once the server starts. The first worker keeps the configured
+    # value, so that RUN_MAINTENANCE=false still disables maintenance altogether.
+    if not run_maintenance:
+        os.environ["RUN_MAINTENANCE"] = "false"
+    config.configure_logging()
+    WorkerServer(config, ready).run(sockets=sockets)
+
+
+class Supervisor:
+    """
+    Pre-fork process manager: keeps `num_workers` uvicorn workers serving on the shared sockets, restarting any
+    that exit unexpectedly. A worker which keeps exiting, e.g. because it fails at startup, is restarted after
+    an exponentially growing delay of up to `max_backoff` seconds.
+
+    The first worker also runs the background database maintenance jobs, which only need to run once per database,
+    unless RUN_MAINTENANCE is false. During a rolling restart its old and new processes both run them until the old
+    one has finished its in-flight requests. That is harmless, as the jobs are idempotent, each takes the write
+    lock, and a new process only runs them once their interval has passed.
+    SIGHUP restarts the workers one at a time, each only stopped once its replacement is accepting connections,
+    so a deploy can be rolled out without dropping requests. Before that, `prepare` is called to apply migrations
+    shipped with the deploy, and the restart is skipped if it fails. SIGINT and SIGTERM shut every worker down
+    gracefully.
+    """
+    def __init__(
+        self,
+        config: uvicorn.Config,
+        sockets: list[socket.socket],
+        num_workers: int,
+        prepare: Callable[[], bool] = lambda: True,
+        ready_timeout: float = 30.0,
+        min_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        self.config = config
+        self.sockets = sockets
+        self.num_workers = num_workers
+        self.prepare = prepare
+        self.ready_timeout = ready_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        # Each ready event is kept alongside its process, as it must stay alive until the worker has unpickled it.
+        self.workers: list[tuple[multiprocessing.Process, Event]] = []
+        # Per worker slot: exits since the worker last became ready, and when to start its replacement.
+        self.failures: list[int] = []
+        self.restart_at: list[float | None] = []
+        self.should_exit = False
+        self.should_restart = False
+
+    def start_worker(self, slot: int) -> tuple[multiprocessing.Process, Event]:
+        ready = spawn.Event()
+        kwargs = {"config": self.config, "sockets": self.sockets, "ready": ready, "run_maintenance": slot == 0}
+        process = spawn.Process(target=run_worker, kwargs=kwargs)
+        process.start()
+        logger.info(f"Started worker process [{process.pid}].")
+        return process, ready
+
+    def stop_worker(self, process: multiprocessing.Process) -> None:
+        process.terminate()
+        process.join(self.config.timeout_graceful_shutdown or self.ready_timeout)
+        if process.is_alive():
+            logger.warning(f"Worker process [{process.pid}] did not shut down in time, killing it.")
+            process.kill()
+            process.join()
+
+    def handle_exit(self, signum, frame) -> None:
+        self.should_exit = True
+
+    def handle_restart(self, signum, frame) -> None:
+        self.should_restart = True
+
+    def rolling_restart(self) -> None:
+        logger.info("Restarting workers.")
+        if not self.prepare():
+            logger.error("Preparing the database and static files failed, not restarting workers.")
+            return
+        for i, (old, _) in enumerate(list(self.workers)):
+            new, ready = self.start_worker(i)
+            if not ready.wait(self.ready_timeout):
+                logger.error(f"Worker process [{new.pid}] did not start within {self.ready_timeout}s, aborting restart.")
+                self.stop_worker(new)
+                return
+            self.workers[i] = (new, ready)
+            self.failures[i], self.restart_at[i] = 0, None
+            self.stop_worker(old)
+        logger.info("Restarted workers.")
+
+    def check_workers(self) -> None:
+        """
+        Restart workers which have exited, after a delay which doubles with every exit since the slot's worker
+        last became ready.
+        """
+        now = time.monotonic()
+        for i, (process, ready) in enumerate(self.workers):
+            if process.is_alive():
+                if ready.is_set():
+                    self.failures[i] = 0
+                continue
+            if self.restart_at[i] is None:
+                self.failures[i] += 1
+                delay = min(self.min_backoff * 2 ** (self.failures[i] - 1), self.max_backoff)
+                logger.warning(f"Worker process [{process.pid}] exited with code {process.exitcode}, restarting it in {delay:g}s.")
+                self.restart_at[i] = now + delay
+            elif now >= self.restart_at[i]:
+                self.restart_at[i] = None
+                self.workers[i] = self.start_worker(i)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGINT, self.handle_exit)
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGHUP, self.handle_restart)
+
+        self.workers = [self.start_worker(i) for i in range(self.num_workers)]
+        self.failures = [0] * self.num_workers
+        self.restart_at = [None] * self.num_workers
+        try:
+            while not self.should_exit:
+                if self.should_restart:
+                    self.should_restart = False
+                    self.rolling_restart()
+                self.check_workers()
+                time.sleep(0.5)
+        finally:
+            logger.info("Shutting down workers.")
+            for process, _ in self.workers:
+                process.terminate()
+            for process, _ in self.workers:
+                self.stop_worker(process)
+
+
+async def prepare_database(database_path: Path, pragmas: list[str], migrations_dir: Path) -> None:
+    from simple_web_app.maintenance import restore_suspended_triggers
+    from simple_web_app.migration import migrate
+
+    async with aiosqlite.connect(database_path, autocommit=True) as conn:
+        for pragma in pragmas:
+            async with conn.execute(pragma):
+                pass
+        await migrate(conn, migrations_dir)
+        await restore_suspended_triggers(conn)
+
+
+def prepare() -> None:
+    """
+    Apply migrations and precompress static files, once for all workers rather than by every worker racing the
+    others at startup.
+    """
+    from simple_web_app import app
+
+    asyncio.run(prepare_database(app.DATABASE_PATH, app.SQLITE_PRAGMAS, app.MIGRATION_DIR))
+    app.precompress_static(Path(app.STATIC_DIR), app.COMPRESSION_MINIMUM_SIZE)
+
+
+def prepare_in_subprocess() -> bool:
+    # A fresh interpreter picks up the migrations and static files of a deploy made since the launcher started.
+    result = subprocess.run([sys.executable, "-c", "from simple_web_app.__main__ import prepare; prepare()"])
+    return result.returncode == 0
+
+
+def uvicorn_config_from_env() -> uvicorn.Config:
+    """
+    Build the worker's uvicorn Config from the same UVICORN_* environment variables the `uvicorn` command reads,
+    by letting its command line parser resolve them.
+    """
+    params = uvicorn.main.make_context("uvicorn", [APP]).params
+    del params["app"], params["app_dir"]
+    # Reloading and worker processes are handled by the launcher itself.
+    for name in ("reload", "reload_dirs", "reload_includes", "reload_excludes", "reload_delay", "workers"):
+        del params[name]
+    params["headers"] = [header.split(":", 1) for header in params["headers"]]
+    if params["log_config"] is None:
+        params["log_config"] = uvicorn.config.LOGGING_CONFIG
+    return uvicorn.Config(APP, **params)
+
+
+def run_workers(config: Config) -> None:
+    if not prepare_in_subprocess():
+        sys.exit(1)
+    os.environ["APPLY_MIGRATIONS"] = "false"
+    os.environ["PRECOMPRESS_STATIC"] = "false"
+
+    uvicorn_config = uvicorn_config_from_env()
+    num_workers = config("WEB_CONCURRENCY", cast=int, default=os.cpu_count() or 1)
+    sock = uvicorn_config.bind_socket()
+    with contextlib.ExitStack() as stack:
+        if not config("METRICS_DIR", default=""):
+            # Shared by the workers, so that each serves the metrics of all of them.
+            os.environ["METRICS_DIR"] = stack.enter_context(tempfile.TemporaryDirectory(prefix="simple-web-app-metrics-"))
+        logger.info(f"Starting {num_workers} workers, send SIGHUP to the parent process [{os.getpid()}] to restart them.")
+        Supervisor(uvicorn_config, [sock], num_workers, prepare=prepare_in_subprocess).run()
 
 
 def run_uvicorn():
-    subprocess.run([sys.executable, "-m", "uvicorn", "simple_web_app.app:app"])
+    config = Config()
+    if config("UVICORN_RELOAD", cast=bool, default=False):
+        # The reloader needs to own the (single) server process.
+        subprocess.run([sys.executable, "-m", "uvicorn", APP])
+        return
+    run_workers(config)
 
 
 if __name__ == "__main__":
-    run_uvicorn()
+    # Spawned workers unpickle run_worker by its module, and `python -m simple_web_app` runs this file as __main__,
+    # which multiprocessing doesn't re-import in the workers. Run from the importable module instead.
+    from simple_web_app.__main__ import run_uvicorn as main
 
+    main()
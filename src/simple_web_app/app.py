@@ -1,27 +1,48 @@
 import asyncio
+import base64
+import binascii
 import contextlib
+import functools
 import importlib.resources
 import logging
 import time
-import os
 import random
 import sqlite3
-import datetime
+from collections.abc import Awaitable, Callable
 from pathlib import Path
 
 import aiosql
-import aiosqlite
+import jinja2
+import orjson
 from starlette.applications import Starlette
 from starlette.config import Config
+from starlette.datastructures import URL
+from starlette.exceptions import HTTPException
 from starlette.middleware import Middleware
-from starlette.middleware.base import BaseHTTPMiddleware
 # from starlette.middleware.sessions import SessionMiddleware
 from starlette.requests import Request
+from starlette.responses import PlainTextResponse, StreamingResponse
 from starlette.routing import Mount, Route
-from starlette.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
 
-from simple_web_app.migration import apply_migrations, create_migrations_table_if_not_exists
+import simple_web_app
+from simple_web_app.cache import FragmentCache, cached_query
+from simple_web_app.db import Database
+from simple_web_app.maintenance import (
+    MaintenanceJob,
+    MaintenanceScheduler,
+    checkpoint_wal,
+    merge_fts,
+    optimize,
+    restore_suspended_triggers,
+)
+from simple_web_app.metrics import MultiProcessRegistry, Registry, instrument_queries
+from simple_web_app.middleware import CompressionMiddleware, ConditionalGetMiddleware, MetricsMiddleware, ProfilingMiddleware
+from simple_web_app.migration import migrate
+from simple_web_app.minify import MinifyHtmlExtension
+from simple_web_app.profiling import profile_queries
+from simple_web_app.search import MATCH_END, MATCH_START, build_match_query, mark_matches
+from simple_web_app.static import FingerprintedStaticFiles, precompress_static
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +60,47 @@ SQLITE_PRAGMAS = [
 config = Config()
 DEBUG = config("DEBUG", cast=bool, default=True)
 DATABASE_PATH = config("DATABASE_PATH", default="./db.sqlite3")
+# Reader connections per worker process. Each has its own thread, and the launcher already runs a worker per CPU, so
+# a small pool is enough to overlap queries without multiplying connections by the number of CPUs twice.
+DATABASE_READERS = config("DATABASE_READERS", cast=int, default=4)
+# Disabled in server workers when the launcher has already applied the migrations and precompressed the static files.
+APPLY_MIGRATIONS = config("APPLY_MIGRATIONS", cast=bool, default=True)
+PRECOMPRESS_STATIC = config("PRECOMPRESS_STATIC", cast=bool, default=True)
+# Check templates for changes on every render, rather than only compiling them once at startup.
+TEMPLATE_AUTO_RELOAD = config("TEMPLATE_AUTO_RELOAD", cast=bool, default=DEBUG)
+# Strip HTML comments and insignificant whitespace from templates as they're compiled.
+MINIFY_TEMPLATES = config("MINIFY_TEMPLATES", cast=bool, default=True)
+BATCH_CATEGORY_LOOKUP = config("BATCH_CATEGORY_LOOKUP", cast=bool, default=True)
+QUERY_CACHE_TTL = config("QUERY_CACHE_TTL", cast=float, default=300.0)
+SEARCH_CACHE_TTL = config("SEARCH_CACHE_TTL", cast=float, default=60.0)
+SEARCH_CACHE_SIZE = config("SEARCH_CACHE_SIZE", cast=int, default=1024)
+FRAGMENT_CACHE_TTL = config("FRAGMENT_CACHE_TTL", cast=float, default=10.0)
+FRAGMENT_CACHE_STALE_TTL = config("FRAGMENT_CACHE_STALE_TTL", cast=float, default=60.0)
+FRAGMENT_CACHE_BUCKET = config("FRAGMENT_CACHE_BUCKET", cast=int, default=60)
+FRAGMENT_CACHE_SIZE = config("FRAGMENT_CACHE_SIZE", cast=int, default=256)
+COMPRESSION_MINIMUM_SIZE = config("COMPRESSION_MINIMUM_SIZE", cast=int, default=500)
+# Send the head of full page loads before running their queries, then stream the rest in chunks of at least
+# STREAM_CHUNK_SIZE characters. Streamed pages aren't kept in the fragment cache.
+STREAM_FULL_PAGES = config("STREAM_FULL_PAGES", cast=bool, default=False)
+STREAM_CHUNK_SIZE = config("STREAM_CHUNK_SIZE", cast=int, default=4096)
+# Background maintenance, set an interval to 0 to disable that job. The launcher disables RUN_MAINTENANCE in all
+# but one of its workers, so that a database doesn't get one set of jobs per worker process.
+RUN_MAINTENANCE = config("RUN_MAINTENANCE", cast=bool, default=True)
+WAL_CHECKPOINT_INTERVAL = config("WAL_CHECKPOINT_INTERVAL", cast=float, default=60.0)
+WAL_CHECKPOINT_SIZE = config("WAL_CHECKPOINT_SIZE", cast=int, default=64 * 1024 * 1024)
+OPTIMIZE_INTERVAL = config("OPTIMIZE_INTERVAL", cast=float, default=3600.0)
+FTS_MERGE_INTERVAL = config("FTS_MERGE_INTERVAL", cast=float, default=600.0)
+CACHE_STATS_INTERVAL = config("CACHE_STATS_INTERVAL", cast=float, default=300.0)
+# In DEBUG, the queries each request runs are logged and warned about if a named query runs more than
+# REPEATED_QUERY_THRESHOLD times, and the plans of those slower than SLOW_QUERY_THRESHOLD seconds are logged (0 to never).
+REPEATED_QUERY_THRESHOLD = config("REPEATED_QUERY_THRESHOLD", cast=int, default=3)
+SLOW_QUERY_THRESHOLD = config("SLOW_QUERY_THRESHOLD", cast=float, default=0.0)
+# Serve Prometheus metrics of request and query latencies, the reader pool and the caches at /metrics.
+METRICS = config("METRICS", cast=bool, default=True)
+# Directory shared by the worker processes, in which each writes its metrics every METRICS_FLUSH_INTERVAL seconds
+# so that /metrics serves the totals of all of them. The launcher uses a temporary one unless this is set.
+METRICS_DIR = config("METRICS_DIR", default="")
+METRICS_FLUSH_INTERVAL = config("METRICS_FLUSH_INTERVAL", cast=float, default=5.0)
 # SECRET_KEY = config("SECRET_KEY", default="asdf")
 
 DATABASE_PATH = Path(DATABASE_PATH)
@@ -47,8 +109,72 @@ TEMPLATE_DIR = importlib.resources.files("simple_web_app").joinpath("templates")
 QUERY_DIR = importlib.resources.files("simple_web_app").joinpath("queries")
 STATIC_DIR = importlib.resources.files("simple_web_app").joinpath("static")
 
-templates = Jinja2Templates(directory=TEMPLATE_DIR)
+static_files = FingerprintedStaticFiles(directory=STATIC_DIR)
+templates = Jinja2Templates(env=jinja2.Environment(
+    loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    auto_reload=TEMPLATE_AUTO_RELOAD,
+    extensions=[MinifyHtmlExtension] if MINIFY_TEMPLATES else [],
+))
 queries_basic = aiosql.from_path(QUERY_DIR / "basic.sql", "aiosqlite")
+metrics = MultiProcessRegistry(METRICS_DIR, METRICS_FLUSH_INTERVAL) if METRICS_DIR else Registry()
+if METRICS:
+    # Before the cached queries below wrap them, so that only queries which actually run are recorded.
+    instrument_queries(queries_basic, metrics)
+if DEBUG:
+    profile_queries(queries_basic, explain_threshold=SLOW_QUERY_THRESHOLD)
+
+# Reference data which rarely changes.
+get_categories = cached_query(maxsize=32, ttl=QUERY_CACHE_TTL)(queries_basic.get_categories)
+# Search-as-you-type sends the same common prefixes over and over.
+search_news = cached_query(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)(queries_basic.search_news)
+
+
+@jinja2.pass_context
+def url_for(context: jinja2.runtime.Context, name: str, /, **path_params) -> URL:
+    """
+    Jinja global returning the root-relative URL of a route, in place of Starlette's absolute one. Pages are
+    shared between requests by the fragment cache, so they mustn't contain the Host header of whichever
+    request rendered them.
+    """
+    request = context["request"]
+    return URL(request.scope.get("root_path", "") + request.scope["router"].url_path_for(name, **path_params))
+
+
+@jinja2.pass_context
+def static_url(context: jinja2.runtime.Context, path: str):
+    """
+    Jinja global returning the fingerprinted URL of a static file, e.g. `{{ static_url('style.css') }}`.
+    """
+    return url_for(context, "static", path=static_files.url_path(path))
+
+
+templates.env.globals["url_for"] = url_for
+templates.env.globals["static_url"] = static_url
+
+
+def compile_templates(env: jinja2.Environment) -> int:
+    """
+    Compile every template into the environment's cache, so that no request waits for one to compile and a
+    syntax error stops the app at startup rather than failing the first request for that template.
+    """
+    names = env.list_templates()
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+# Seconds spent in each phase of starting the app, logged once it's ready to serve.
+startup_timings: dict[str, float] = {}
+
+
+@contextlib.contextmanager
+def startup_phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - start
 
 
 def is_htmx_request(request: Request) -> bool:
@@ -83,44 +209,164 @@ def render(
     )
 
 
-def format_timedelta(tdelta, fmt):
-    d = {"days": tdelta.days}
-    d["hours"], rem = divmod(tdelta.seconds, 3600)
+# Rendered in place of the content of application.html, to split it into the parts before and after the content.
+CONTENT_MARKER = "\x00"
+content_marker = templates.env.from_string(CONTENT_MARKER)
+
+
+def stream(request: Request, partial_template: str, get_context: Callable[[], Awaitable[dict]], headers: dict | None = None) -> StreamingResponse:
+    """
+    Stream the full page `render` would return for a non-HTMX request. The application shell up to the content
+    is sent right away, so that the browser starts fetching the stylesheets and scripts in its head, then
+    `partial_template` once `get_context` has returned its context, in chunks as it's rendered.
+
+    The status is sent before `get_context` runs, so the request must have been validated beforehand; an
+    error after that ends the response early.
+    """
+    async def body():
+        ctx = {"request": request, "is_authenticated": False}
+        shell = templates.get_template("application.html").render(ctx | {"content": content_marker})
+        before, after = shell.split(CONTENT_MARKER)
+        yield before
+        ctx |= await get_context()
+        chunk, size = [], 0
+        for piece in templates.get_template(partial_template).generate(ctx):
+            chunk.append(piece)
+            size += len(piece)
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(chunk)
+                chunk, size = [], 0
+        yield "".join(chunk) + after
+
+    return StreamingResponse(body(), media_type="text/html", headers=headers)
+
+
+def format_duration(seconds: int, fmt: str) -> str:
+    d = {}
+    d["days"], rem = divmod(seconds, 86400)
+    d["hours"], rem = divmod(rem, 3600)
     d["minutes"], d["seconds"] = divmod(rem, 60)
     return fmt.format(**d)
 
 
+# Larger than any rowid, so that a cursor built from it includes every row published at the same time.
+MAX_NEWS_ITEM_ID = 2**63 - 1
+# Epoch timestamps are bound as SQLite's signed 64 bit integers.
+MIN_TIMESTAMP, MAX_TIMESTAMP = -(2**63), 2**63 - 1
+
+
+def _is_int_in_range(value, minimum: int, maximum: int) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and minimum <= value <= maximum
+
+
+def encode_cursor(published_at: int, news_item_id: int) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([published_at, news_item_id])).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        published_at, news_item_id = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not _is_int_in_range(published_at, MIN_TIMESTAMP, MAX_TIMESTAMP) or not _is_int_in_range(news_item_id, 0, MAX_NEWS_ITEM_ID):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return published_at, news_item_id
+
+
+def parse_snapshot_time(value: str) -> int:
+    try:
+        snapshot_time = int(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid current_time")
+    if not _is_int_in_range(snapshot_time, MIN_TIMESTAMP, MAX_TIMESTAMP):
+        raise HTTPException(status_code=400, detail="Invalid current_time")
+    return snapshot_time
+
+
+async def get_categories_for_news(conn, news_item_ids: list[int]) -> list[list[dict]]:
+    """
+    Fetch the categories of several news items in a single query, returned in the same order as `news_item_ids`.
+    """
+    if not news_item_ids:
+        return []
+    rows = await queries_basic.get_categories_for_news_batch(conn, news_item_ids=orjson.dumps(news_item_ids).decode())
+    categories = {news_item_id: [] for news_item_id in news_item_ids}
+    for row in rows:
+        categories[row["news_item_id"]].append({"id": row["id"], "name": row["name"]})
+    return [categories[news_item_id] for news_item_id in news_item_ids]
+
+
+def get_snapshot_time() -> int:
+    """
+    The time up to which news is shown on a fresh page load, in Unix epoch seconds.
+
+    When fragment caching is enabled it is rounded down to FRAGMENT_CACHE_BUCKET seconds, so that every
+    request within the same bucket renders (and caches) the same page.
+    """
+    now = int(time.time())
+    if FRAGMENT_CACHE_TTL > 0 and FRAGMENT_CACHE_BUCKET > 0:
+        now -= now % FRAGMENT_CACHE_BUCKET
+    return now
+
+
 async def show_home_page(request: Request):
-    page = request.query_params.get("page", default=0)
-    page = int(page) if page is not None else page
-    current_time = request.query_params.get("current_time", default=datetime.datetime.now(tz=datetime.UTC))
+    current_time = request.query_params.get("current_time")
+    current_time = parse_snapshot_time(current_time) if current_time else get_snapshot_time()
     category_id = request.query_params.get("category_id")
     category_id = int(category_id) if category_id is not None else None
+    cursor = request.query_params.get("cursor")
+    cursor_position = decode_cursor(cursor) if cursor is not None else (current_time, MAX_NEWS_ITEM_ID)
+
+    if STREAM_FULL_PAGES and not is_htmx_request(request):
+        return stream(request, "index.html", lambda: get_home_page_context(request, current_time, category_id, cursor, cursor_position))
 
+    async def render_page():
+        return await render_home_page(request, current_time, category_id, cursor, cursor_position)
+
+    # Every user sees the same page for the same parameters, since nothing on it depends on the user.
+    if FRAGMENT_CACHE_TTL <= 0:
+        return await render_page()
+    key = (current_time, category_id, cursor, is_htmx_request(request))
+    return await request.state.fragment_cache.get_or_render(key, render_page)
+
+
+async def get_home_page_context(request: Request, current_time: int, category_id: int | None, cursor: str | None, cursor_position: tuple[int, int]) -> dict:
+    cursor_published_at, cursor_id = cursor_position
     limit = 5
-    offset = page * limit
 
-    all_categories = await queries_basic.get_categories(request.state.conn, limit=20)
+    async with request.state.db.reader() as conn:
+        all_categories = await get_categories(conn, limit=20)
 
-    rows = (
-        await queries_basic.get_news_by_category(request.state.conn, category_id=category_id, limit=limit + 1, offset=offset, max_published_time=current_time)
-        if category_id
-        else
-        await queries_basic.get_news(request.state.conn, limit=limit + 1, offset=offset, max_published_time=current_time)
-    )
-    reached_end = len(rows) <= limit
-    rows = rows[:limit]
-    categories = await asyncio.gather(*[queries_basic.get_categories_for_news(request.state.conn, news_item_id=row["id"]) for row in rows])
+        rows = (
+            await queries_basic.get_news_by_category(conn, category_id=category_id, limit=limit + 1, max_published_at=current_time, cursor_published_at=cursor_published_at, cursor_id=cursor_id)
+            if category_id
+            else
+            await queries_basic.get_news(conn, limit=limit + 1, max_published_at=current_time, cursor_published_at=cursor_published_at, cursor_id=cursor_id)
+        )
+        reached_end = len(rows) <= limit
+        rows = rows[:limit]
+        categories = (
+            await get_categories_for_news(conn, [row["id"] for row in rows])
+            if BATCH_CATEGORY_LOOKUP
+            else
+            await asyncio.gather(*[queries_basic.get_categories_for_news(conn, news_item_id=row["id"]) for row in rows])
+        )
 
-    current_time_utc = datetime.datetime.now(tz=datetime.UTC)
-    def _get_time_since_published(published: str, current_time: datetime):
-        published = datetime.datetime.strptime(published, "%Y-%m-%dT%H:%M:%S.%f%z")
-        return format_timedelta(current_time - published, "{days} days, {hours} hours ago")
-    times_since_published = [_get_time_since_published(row["published"], current_time_utc) for row in rows]
+    now = int(time.time())
+    times_since_published = [format_duration(now - row["published_at"], "{days} days, {hours} hours ago") for row in rows]
 
     news = [{**row, "categories": c, "time_since_published": tsp} for row, c, tsp in zip(rows, categories, times_since_published, strict=True)]
-    context = {"news": news, "categories": all_categories, "page": page, "current_time": current_time, "category_id": category_id, "reached_end": reached_end}
+    next_cursor = encode_cursor(rows[-1]["published_at"], rows[-1]["id"]) if rows else cursor
+    load_more_params = {"current_time": current_time}
+    if next_cursor:
+        load_more_params["cursor"] = next_cursor
+    if category_id:
+        load_more_params["category_id"] = category_id
+    return {"news": news, "categories": all_categories, "load_more_params": load_more_params, "current_time": current_time, "category_id": category_id, "reached_end": reached_end}
 
+
+async def render_home_page(request: Request, current_time: int, category_id: int | None, cursor: str | None, cursor_position: tuple[int, int]):
+    context = await get_home_page_context(request, current_time, category_id, cursor, cursor_position)
     if is_htmx_request(request):
         context = context | {"oob": True}
     template_name = "oob_swap.html" if is_htmx_request(request) else "index.html"
@@ -134,8 +380,14 @@ async def open_search(request: Request):
 async def search(request: Request):
     async with request.form() as form:
         query = form["search"]
-    rows = await queries_basic.search_news(request.state.conn, query=query, limit=10) if query else []
-    return render(request, "search_results.html", context={"news": rows})
+    match_query = build_match_query(query)
+    if match_query:
+        async with request.state.db.reader() as conn:
+            rows = await search_news(conn, query=match_query, limit=10, match_start=MATCH_START, match_end=MATCH_END)
+    else:
+        rows = []
+    news = [{"id": row["id"], "title": mark_matches(row["title"]), "snippet": mark_matches(row["snippet"])} for row in rows]
+    return render(request, "search_results.html", context={"news": news})
 
 
 async def open_settings(request: Request):
@@ -148,30 +400,102 @@ async def open_settings_tab(request: Request):
     return render(request, "settings_tab.html" , context={"tab": tab})
 
 
-class CacheControlMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        if request.headers.get("HX-Preloaded") == "true":
-            response.headers['cache-control'] = 'private, max-age=60'
-        return response
+def get_caches(fragment_cache: FragmentCache) -> dict:
+    return {"get_categories": get_categories.cache, "search_news": search_news.cache, "fragment": fragment_cache}
+
+
+async def get_cache_stats(fragment_cache: FragmentCache) -> dict[str, dict]:
+    """
+    Stats of this process' caches, logged periodically by the lifespan so that hit ratios can be followed on a
+    running server.
+    """
+    return {name: cache.stats() for name, cache in get_caches(fragment_cache).items()}
+
+
+# Stat of the reader pool or the caches: Prometheus metric name, type and help text.
+POOL_METRICS = {
+    "checkouts": ("db_pool_checkouts_total", "counter", "Reader connections checked out."),
+    "waits": ("db_pool_waits_total", "counter", "Reader checkouts which had to wait for a connection to be returned."),
+    "total_wait_seconds": ("db_pool_wait_seconds_total", "counter", "Time spent waiting for reader connections."),
+    "max_wait_seconds": ("db_pool_max_wait_seconds", "gauge", "Longest wait for a reader connection."),
+    "in_use": ("db_pool_in_use", "gauge", "Reader connections checked out right now."),
+}
+CACHE_METRICS = {
+    "hits": ("cache_hits_total", "counter", "Lookups answered from the cache."),
+    "stale_hits": ("cache_stale_hits_total", "counter", "Lookups answered with a stale entry while it is rendered again."),
+    "coalesced": ("cache_coalesced_total", "counter", "Lookups which waited for an identical query in flight instead of running it."),
+    "misses": ("cache_misses_total", "counter", "Lookups which had to run the query or render the page."),
+    "invalidations": ("cache_invalidations_total", "counter", "Times the cache was cleared because the database changed."),
+    "renders": ("cache_renders_total", "counter", "Pages rendered to fill the cache."),
+    "size": ("cache_size", "gauge", "Entries in the cache."),
+    "hit_ratio": ("cache_hit_ratio", "gauge", "Fraction of lookups which didn't run the query."),
+}
+
+
+def register_app_metrics(db: Database, fragment_cache: FragmentCache) -> None:
+    """
+    Export the stats the reader pool and caches keep anyway, read whenever /metrics is scraped.
+    """
+    metrics.callback("db_pool_readers", "Reader connections in the pool.", "gauge", [], lambda: {(): db.num_readers})
+    for stat, (name, metric_type, help) in POOL_METRICS.items():
+        metrics.callback(name, help, metric_type, [], lambda stat=stat: {(): getattr(db.stats, stat)})
+
+    caches = get_caches(fragment_cache)
+
+    def collect(stat: str) -> dict[tuple, float]:
+        stats = {name: cache.stats() for name, cache in caches.items()}
+        return {(name,): cache_stats[stat] for name, cache_stats in stats.items() if stat in cache_stats}
+
+    for stat, (name, metric_type, help) in CACHE_METRICS.items():
+        metrics.callback(name, help, metric_type, ["cache"], functools.partial(collect, stat))
+
+
+async def show_metrics(request: Request):
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 @contextlib.asynccontextmanager
 async def lifespan(app: Starlette):
     logger.debug("START LIFESPAN")
-    async with aiosqlite.connect(DATABASE_PATH, autocommit=True) as conn:
-        conn.row_factory = aiosqlite.Row
-
-        await create_migrations_table_if_not_exists(conn)
-        migration_files = sorted(MIGRATION_DIR.glob("*.sql"))
-        migration_queries = [p.read_text() for p in migration_files]
-        await apply_migrations(conn, migration_queries)
-
-        cursors = [conn.execute(query) for query in SQLITE_PRAGMAS]
-        [await c for c in cursors]
-        logger.debug("FINISH LIFESPAN")
-        yield {"conn": conn}
+    if PRECOMPRESS_STATIC:
+        with startup_phase("precompress_static"):
+            await asyncio.to_thread(precompress_static, Path(STATIC_DIR), COMPRESSION_MINIMUM_SIZE)
+    with startup_phase("fingerprint_static"):
+        await asyncio.to_thread(static_files.fingerprint)
+    with startup_phase("compile_templates"):
+        await asyncio.to_thread(compile_templates, templates.env)
+    async with contextlib.AsyncExitStack() as stack:
+        with startup_phase("open_database"):
+            db = await stack.enter_async_context(Database(DATABASE_PATH, readers=DATABASE_READERS, pragmas=SQLITE_PRAGMAS))
+        if APPLY_MIGRATIONS:
+            with startup_phase("migrate"):
+                async with db.writer() as conn:
+                    await migrate(conn, MIGRATION_DIR)
+                    await restore_suspended_triggers(conn)
+
+        fragment_cache = FragmentCache(maxsize=FRAGMENT_CACHE_SIZE, ttl=FRAGMENT_CACHE_TTL, stale_ttl=FRAGMENT_CACHE_STALE_TTL)
+        # Before the database is closed, as the stack exits in reverse.
+        stack.push_async_callback(fragment_cache.close)
+        if METRICS:
+            register_app_metrics(db, fragment_cache)
+            if isinstance(metrics, MultiProcessRegistry):
+                await stack.enter_async_context(metrics)
+        jobs = [MaintenanceJob("cache_stats", CACHE_STATS_INTERVAL, lambda: get_cache_stats(fragment_cache))]
+        if RUN_MAINTENANCE:
+            jobs += [
+                MaintenanceJob("wal_checkpoint", WAL_CHECKPOINT_INTERVAL, lambda: checkpoint_wal(db, WAL_CHECKPOINT_SIZE)),
+                MaintenanceJob("optimize", OPTIMIZE_INTERVAL, lambda: optimize(db)),
+                MaintenanceJob("fts_merge", FTS_MERGE_INTERVAL, lambda: merge_fts(db)),
+            ]
+        async with MaintenanceScheduler(jobs):
+            logger.debug("FINISH LIFESPAN")
+            startup_time = time.perf_counter() - simple_web_app.IMPORTED_AT
+            logger.info(f"Started in {startup_time * 1000:.0f}ms: " + ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in startup_timings.items()))
+            yield {"db": db, "fragment_cache": fragment_cache}
         logger.debug("KILL LIFESPAN")
+        logger.info(f"get_categories cache stats: {get_categories.cache.stats()}")
+        logger.info(f"search_news cache stats: {search_news.cache.stats()}")
+        logger.info(f"Fragment cache stats: {fragment_cache.stats()}")
 
 
 routes = [
@@ -180,15 +504,24 @@ routes = [
     Route("/search", methods=["POST"], endpoint=search, name="search"),
     Route("/settings", methods=["GET"], endpoint=open_settings, name="settings_page"),
     Route("/settings/tab", methods=["GET"], endpoint=open_settings_tab, name="settings_tab"),
-    Mount("/static", StaticFiles(directory=STATIC_DIR), name="static"),
+    Mount("/static", static_files, name="static"),
 ]
+if METRICS:
+    routes.append(Route("/metrics", methods=["GET"], endpoint=show_metrics, name="metrics"))
 middleware = [
-    Middleware(CacheControlMiddleware),
+    Middleware(CompressionMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE),
+    Middleware(ConditionalGetMiddleware),
     # Middleware(SessionMiddleware, secret_key=SECRET_KEY),
 ]
+if DEBUG:
+    middleware.insert(0, Middleware(ProfilingMiddleware, repeated_query_threshold=REPEATED_QUERY_THRESHOLD))
+if METRICS:
+    # Outermost, so that request latencies include compression.
+    middleware.insert(0, Middleware(MetricsMiddleware, registry=metrics, routes=routes))
 app = Starlette(
     debug=DEBUG,
     routes=routes,
     middleware=middleware,
     lifespan=lifespan,
 )
+startup_timings["import"] = time.perf_counter() - simple_web_app.IMPORTED_AT
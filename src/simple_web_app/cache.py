@@ -0,0 +1,311 @@
+import asyncio
+import collections
+import dataclasses
+import functools
+import logging
+import time
+import weakref
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+import aiosqlite
+from starlette.responses import Response
+
+from simple_web_app.middleware import compute_etag
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class QueryCache:
+    """
+    Bounded LRU cache with a per-entry TTL which is cleared whenever the database changes.
+
+    Changes are detected with `PRAGMA data_version`, which changes whenever another connection commits to the
+    database. The value is only comparable between calls on the same connection, so the last value seen is
+    tracked per connection and the first lookup through a connection the cache hasn't seen before clears it.
+    Writes made through the same connection as the lookups are not detected, so cached queries should only be
+    run on reader connections. Any commit clears the cache, not only one to the tables a query reads, including
+    the maintenance jobs' FTS merges and ANALYZE runs, which happen at most every few minutes.
+
+    `hits` counts lookups served from the cache, `coalesced` lookups which waited for an identical in-flight
+    query instead of running their own, and `misses` queries actually run.
+
+    @param int maxsize: Maximum number of entries kept before the least recently used one is evicted.
+    @param float ttl: Seconds an entry is served for after it was stored.
+    """
+    def __init__(self, maxsize: int = 128, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: collections.OrderedDict[Hashable, tuple[float, Any]] = collections.OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._data_versions: weakref.WeakKeyDictionary[aiosqlite.Connection, int] = weakref.WeakKeyDictionary()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        """
+        Fraction of lookups which didn't run a query, either because of a cache hit or a coalesced query.
+        """
+        lookups = self.hits + self.coalesced + self.misses
+        return (self.hits + self.coalesced) / lookups if lookups else 0.0
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "size": len(self),
+            "hit_ratio": round(self.hit_ratio, 3),
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def check_data_version(self, conn: aiosqlite.Connection) -> None:
+        """
+        Clear the cache if the database has changed since the last lookup through `conn`.
+        """
+        result = await conn.execute("PRAGMA data_version;")
+        (data_version,) = await result.fetchone()
+        if self._data_versions.get(conn) != data_version:
+            self._data_versions[conn] = data_version
+            if self._entries:
+                self.invalidations += 1
+                self.clear()
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+def cached_query(maxsize: int = 128, ttl: float = 60.0) -> Callable:
+    """
+    Decorator caching the results of an aiosql query function called as `fn(conn, **params)`.
+
+    Results are keyed on the query parameters, so the decorated function only accepts keyword parameters.
+    Concurrent calls with the same parameters share a single execution of the query.
+    The cache is exposed as the `cache` attribute of the returned function, e.g. to read its hit/miss counters.
+
+        get_categories = cached_query(ttl=300)(queries_basic.get_categories)
+    """
+    def decorator(fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        cache = QueryCache(maxsize=maxsize, ttl=ttl)
+
+        @functools.wraps(fn)
+        async def wrapper(conn: aiosqlite.Connection, **params):
+            await cache.check_data_version(conn)
+            key = tuple(sorted(params.items()))
+            value = cache.get(key)
+            if value is not _MISSING:
+                cache.hits += 1
+            else:
+                value = await _run_once(key, functools.partial(fn, conn, **params))
+            # Copy lists so callers can't modify the cached value.
+            return list(value) if isinstance(value, list) else value
+
+        async def _run_once(key: Hashable, query: Callable[[], Awaitable[Any]]) -> Any:
+            inflight = cache._inflight.get(key)
+            if inflight is not None:
+                try:
+                    value = await asyncio.shield(inflight)
+                    cache.coalesced += 1
+                    return value
+                except asyncio.CancelledError:
+                    # Run the query ourselves if the call running it was cancelled, rather than this one.
+                    if not inflight.cancelled():
+                        raise
+
+            cache.misses += 1
+            future = asyncio.get_running_loop().create_future()
+            cache._inflight[key] = future
+            try:
+                value = await query()
+                cache.set(key, value)
+                future.set_result(value)
+                return value
+            except Exception as e:
+                future.set_exception(e)
+                # Mark the exception as retrieved, since there may be no other call waiting on it.
+                future.exception()
+                raise
+            finally:
+                if not future.done():
+                    future.cancel()
+                if cache._inflight.get(key) is future:
+                    del cache._inflight[key]
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+@dataclasses.dataclass
+class CachedResponse:
+    body: bytes
+    headers: dict[str, str]
+    fresh_until: float
+    stale_until: float
+
+    def to_response(self, cache_status: str) -> Response:
+        return Response(content=self.body, headers=self.headers | {"x-cache": cache_status})
+
+
+class FragmentCache:
+    """
+    Bounded cache of rendered responses with stale-while-revalidate and single-flight rendering.
+
+    An entry is served as-is for `ttl` seconds. For a further `stale_ttl` seconds it is still served, but the
+    first request to see it stale starts a background re-render to replace it. Concurrent misses for the same
+    key share a single render, so an expiry under load renders once instead of once per request.
+
+    @param int maxsize: Maximum number of entries kept before the least recently used one is evicted.
+    @param float ttl: Seconds an entry is fresh for.
+    @param float stale_ttl: Seconds an entry may be served stale for after it stops being fresh.
+    """
+    def __init__(self, maxsize: int = 256, ttl: float = 10.0, stale_ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.renders = 0
+        self._entries: collections.OrderedDict[Hashable, CachedResponse] = collections.OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future[CachedResponse | None]] = {}
+        self._refresh_tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "renders": self.renders,
+            "size": len(self),
+        }
+
+    async def close(self) -> None:
+        """
+        Cancel the background re-renders still running, so that none outlives the database connections it uses.
+        """
+        for task in self._refresh_tasks:
+            task.cancel()
+        await asyncio.gather(*self._refresh_tasks, return_exceptions=True)
+
+    async def get_or_render(self, key: Hashable, render: Callable[[], Awaitable[Response]]) -> Response:
+        """
+        Return the cached response for `key`, calling `render` to produce it if necessary.
+
+        Only 200 responses are cached. `render` may be called after the request which triggered it has
+        finished, to refresh a stale entry in the background.
+        """
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now < entry.stale_until:
+            self._entries.move_to_end(key)
+            if now < entry.fresh_until:
+                self.hits += 1
+                return entry.to_response("hit")
+            self.stale_hits += 1
+            if key not in self._inflight:
+                future = self._start_render(key)
+                task = asyncio.create_task(self._refresh(key, render, future))
+                self._refresh_tasks.add(task)
+                task.add_done_callback(functools.partial(self._refresh_done, key, future))
+            return entry.to_response("stale")
+
+        self.misses += 1
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                entry = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Render ourselves if the request rendering this key was cancelled, rather than this one.
+                if not inflight.cancelled():
+                    raise
+                entry = None
+            if entry is not None:
+                return entry.to_response("hit")
+        response = await self._render(key, render, self._start_render(key))
+        response.headers["x-cache"] = "miss"
+        return response
+
+    def _start_render(self, key: Hashable) -> asyncio.Future[CachedResponse | None]:
+        # Registered before any await, so that requests arriving in the meantime wait for this render.
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        return future
+
+    async def _render(self, key: Hashable, render: Callable[[], Awaitable[Response]], future: asyncio.Future[CachedResponse | None]) -> Response:
+        try:
+            self.renders += 1
+            response = await render()
+            entry = None
+            if response.status_code == 200:
+                # Computed once here, so that conditional requests for cached entries don't hash the body.
+                response.headers["etag"] = compute_etag(response.body)
+                now = time.monotonic()
+                entry = CachedResponse(
+                    body=response.body,
+                    headers=dict(response.headers),
+                    fresh_until=now + self.ttl,
+                    stale_until=now + self.ttl + self.stale_ttl,
+                )
+                self._store(key, entry)
+            future.set_result(entry)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved, since there may be no other request waiting on it.
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _refresh(self, key: Hashable, render: Callable[[], Awaitable[Response]], future: asyncio.Future[CachedResponse | None]) -> None:
+        try:
+            await self._render(key, render, future)
+        except Exception:
+            logger.exception(f"Failed to refresh cached fragment {key}")
+
+    def _refresh_done(self, key: Hashable, future: asyncio.Future[CachedResponse | None], task: asyncio.Task) -> None:
+        self._refresh_tasks.discard(task)
+        # A task cancelled before it started never ran the cleanup in _render.
+        if not future.done():
+            future.cancel()
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def _store(self, key: Hashable, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
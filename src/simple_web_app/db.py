@@ -0,0 +1,133 @@
+import asyncio
+import contextlib
+import dataclasses
+import logging
+import time
+import uuid
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class PoolStats:
+    checkouts: int = 0
+    waits: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    in_use: int = 0
+
+    def record_checkout(self, wait_seconds: float, waited: bool) -> None:
+        self.checkouts += 1
+        self.in_use += 1
+        if waited:
+            self.waits += 1
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def record_return(self) -> None:
+        self.in_use -= 1
+
+
+class Database:
+    """
+    One dedicated writer connection plus a pool of read-only connections to the same SQLite database.
+
+    SQLite in WAL mode serves any number of concurrent readers alongside a single writer, but every aiosqlite
+    connection runs its queries on its own background thread, so sharing a single connection serializes all
+    requests. Readers are checked out per request with `reader()` and writes are serialized through `writer()`.
+
+    @param path: Path to the database file. ":memory:" creates a shared-cache in-memory database so that all
+        connections in the pool see the same data.
+    @param readers: Number of read-only connections in the pool.
+    @param pragmas: PRAGMA statements applied to every connection when it is opened.
+    """
+    def __init__(self, path: Path | str, readers: int, pragmas: list[str]):
+        if str(path) == ":memory:":
+            self._database = f"file:simple_web_app-{uuid.uuid4().hex}?mode=memory&cache=shared"
+            self._uri = True
+        else:
+            self._database = path
+            self._uri = False
+        self.path = path
+        self.num_readers = readers
+        self.pragmas = pragmas
+        self.stats = PoolStats()
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._all_readers: list[aiosqlite.Connection] = []
+
+    async def _connect(self, read_only: bool) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self._database, uri=self._uri, autocommit=True)
+        conn.row_factory = aiosqlite.Row
+        try:
+            for pragma in self.pragmas:
+                # Closed right away, since a pragma which returns a row (e.g. journal_mode) otherwise keeps its
+                # statement active, holding a lock that stops other connections from opening.
+                async with conn.execute(pragma):
+                    pass
+            if read_only:
+                async with conn.execute("PRAGMA query_only = ON;"):
+                    pass
+        except BaseException:
+            await conn.close()
+            raise
+        return conn
+
+    async def open(self) -> None:
+        # The writer is opened first so that journal_mode = WAL is in place before any reader attaches.
+        self._writer = await self._connect(read_only=False)
+        results = await asyncio.gather(*[self._connect(read_only=True) for _ in range(self.num_readers)], return_exceptions=True)
+        self._all_readers = [conn for conn in results if isinstance(conn, aiosqlite.Connection)]
+        errors = [e for e in results if isinstance(e, BaseException)]
+        if errors:
+            # __aexit__ isn't called when __aenter__ fails, and aiosqlite's threads would keep the process alive.
+            await self.close()
+            raise errors[0]
+        for conn in self._all_readers:
+            self._readers.put_nowait(conn)
+        logger.info(f"Opened database {self.path} with 1 writer and {self.num_readers} reader connections.")
+
+    async def close(self) -> None:
+        logger.info(f"Closing database {self.path}. Reader pool stats: {self.stats}")
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers = []
+        self._readers = asyncio.Queue()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    async def __aenter__(self) -> "Database":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @contextlib.asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Check out a read-only connection for the duration of the block, waiting if all of them are in use.
+        """
+        start = time.perf_counter()
+        waited = self._readers.empty()
+        conn = await self._readers.get()
+        self.stats.record_checkout(time.perf_counter() - start, waited)
+        try:
+            yield conn
+        finally:
+            self.stats.record_return()
+            self._readers.put_nowait(conn)
+
+    @contextlib.asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Take exclusive use of the writer connection for the duration of the block.
+        """
+        async with self._write_lock:
+            yield self._writer
@@ -0,0 +1,195 @@
+import datetime
+import itertools
+import logging
+import math
+import random
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import aiosqlite
+
+from simple_web_app.ingest import insert_rows, suspended_fts_triggers
+from simple_web_app.maintenance import restore_suspended_triggers
+from simple_web_app.migration import migrate
+
+logger = logging.getLogger(__name__)
+
+# Number of news items generated for each preset.
+PRESETS = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+CATEGORIES = [
+    "Politics", "World", "Business", "Economy", "Technology", "Science", "Health", "Climate", "Sport", "Football",
+    "Culture", "Film", "Music", "Books", "Travel", "Food", "Education", "Law", "Crime", "Media",
+    "Energy", "Transport", "Housing", "Defence", "Space", "Weather", "Religion", "Fashion", "Gaming", "Obituaries",
+]
+# Mostly English, which is the only language the feed shows, with some articles in other languages.
+LANGUAGES = {"english": 0.8, "german": 0.08, "french": 0.06, "spanish": 0.06}
+
+# Words in roughly descending order of frequency. Common words dominate the text the way they do in real articles,
+# so that searches for them match most rows while the topic words near the end match few.
+WORDS = """
+the of and to a in is that for it on was with as be by at he said this from are have has but not they an his
+which were will would their been had more one after new also who we about year people there up out when two
+than all government can years first could last over time other into may some her its them just only now such
+most told many percent city state officials week country like president minister public police report court
+market company says group national because before against while where million three before made through world
+during still since under between including health high well back former home data region local second day
+election policy economy climate energy prices workers school children hospital water election support plan
+football season team match league coach players cup final victory defeat transfer stadium fans goal injury
+research study scientists university space mission satellite vaccine virus patients treatment doctors trial
+technology software company chips semiconductor network users internet platform artificial intelligence data
+storm flooding earthquake wildfire drought temperatures emissions carbon renewable solar wind coal nuclear
+parliament referendum coalition opposition senate congress vote voters campaign candidate reform budget tax
+bank inflation interest rates shares investors growth recession trade tariffs exports imports currency debt
+film festival album concert novel author museum exhibition theatre director award critics audience premiere
+""".split()
+WORDS = list(dict.fromkeys(WORDS))
+FIRST_NAMES = ["Anna", "Ben", "Chloe", "David", "Elena", "Farid", "Grace", "Hiro", "Ines", "Jonas", "Kemi", "Lars", "Maya", "Noah", "Olga", "Pablo"]
+LAST_NAMES = ["Andersen", "Brown", "Costa", "Dubois", "Evans", "Fischer", "Garcia", "Hansen", "Ito", "Jensen", "Kowalski", "Larsen", "Moreau", "Nielsen"]
+
+# Default end of the range of publish times, fixed so that a seed always generates the same rows.
+DEFAULT_END = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+SENTENCE_POOL_SIZE = 20_000
+
+
+def _zipf_cum_weights(n: int, exponent: float = 1.0) -> list[float]:
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def _sentences(rng: random.Random, size: int) -> list[str]:
+    """
+    A pool of sentences which articles are built from, since choosing every word of millions of articles one at a
+    time would take far longer than inserting them.
+    """
+    cum_weights = _zipf_cum_weights(len(WORDS))
+    sentences = []
+    for _ in range(size):
+        words = rng.choices(WORDS, cum_weights=cum_weights, k=rng.randint(6, 24))
+        sentences.append(" ".join(words).capitalize() + ".")
+    return sentences
+
+
+def generate_categories() -> Iterator[tuple]:
+    for i, name in enumerate(CATEGORIES, start=1):
+        yield i, name
+
+
+def generate_news_items(count: int, seed: int = 0, first_id: int = 1, years: float = 5.0, end: datetime.datetime = DEFAULT_END) -> Iterator[tuple]:
+    """
+    Yield `count` news items as (id, url, title, text, published, published_at, author, language) rows.
+
+    Texts vary from a couple of sentences to long features, with a log-normal length distribution like real
+    articles. Publish times are spread evenly over the `years` before `end`, in id order with some jitter.
+    """
+    rng = random.Random(f"{seed}-news_item")
+    sentences = _sentences(rng, SENTENCE_POOL_SIZE)
+    title_cum_weights = _zipf_cum_weights(len(WORDS), exponent=0.7)
+    authors = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    languages, language_weights = list(LANGUAGES), list(LANGUAGES.values())
+    end_at = int(end.timestamp())
+    step = years * 365.25 * 86400 / max(count, 1)
+    for i in range(count):
+        news_item_id = first_id + i
+        published_at = int(end_at - (count - i) * step + rng.uniform(0, step))
+        published = datetime.datetime.fromtimestamp(published_at, tz=datetime.UTC).isoformat()
+        title = " ".join(rng.choices(WORDS, cum_weights=title_cum_weights, k=rng.randint(4, 12))).capitalize()
+        num_sentences = min(max(round(rng.lognormvariate(math.log(15), 0.7)), 2), 300)
+        text = " ".join(rng.choices(sentences, k=num_sentences))
+        yield (
+            news_item_id,
+            f"https://news.example.com/articles/{news_item_id}",
+            title,
+            text,
+            published,
+            published_at,
+            rng.choice(authors) if rng.random() < 0.9 else None,
+            rng.choices(languages, weights=language_weights)[0],
+        )
+
+
+def generate_news_item_categories(count: int, seed: int = 0, first_id: int = 1) -> Iterator[tuple]:
+    """
+    Yield (news_item_id, category_id) rows giving each news item one to three categories. A few categories hold
+    most of the articles, the rest only a handful, so that filtering is tested on both.
+    """
+    rng = random.Random(f"{seed}-news_item_category")
+    category_ids = [category_id for category_id, _ in generate_categories()]
+    cum_weights = _zipf_cum_weights(len(category_ids), exponent=1.2)
+    for news_item_id in range(first_id, first_id + count):
+        for category_id in sorted(set(rng.choices(category_ids, cum_weights=cum_weights, k=rng.randint(1, 3)))):
+            yield news_item_id, category_id
+
+
+async def generate(conn: aiosqlite.Connection, count: int, seed: int = 0, batch_size: int = 50_000, **kwargs) -> dict[str, int]:
+    """
+    Insert `count` generated news items and their categories into a migrated database, after any rows it
+    already has. The same seed always generates the same rows. Returns the number of rows inserted per table.
+
+    The full-text index is rebuilt once at the end rather than updated for every row.
+    """
+    result = await conn.execute("SELECT coalesce(max(id), 0) + 1 FROM news_item;")
+    (first_id,) = await result.fetchone()
+    counts = {}
+    async with suspended_fts_triggers(conn):
+        counts["category"] = await insert_rows(conn, "category", ["id", "name"], generate_categories(), batch_size, ignore_existing=True)
+        counts["news_item"] = await insert_rows(
+            conn,
+            "news_item",
+            ["id", "url", "title", "text", "published", "published_at", "author", "language"],
+            generate_news_items(count, seed, first_id, **kwargs),
+            batch_size,
+        )
+        counts["news_item_category"] = await insert_rows(
+            conn,
+            "news_item_category",
+            ["news_item_id", "category_id"],
+            generate_news_item_categories(count, seed, first_id),
+            batch_size,
+        )
+    return counts
+
+
+async def run_generate_async(database_path: str | Path, count: int, seed: int = 0, **kwargs) -> dict[str, int]:
+    from simple_web_app.app import MIGRATION_DIR, SQLITE_PRAGMAS
+
+    async with aiosqlite.connect(database_path, autocommit=True) as conn:
+        for pragma in SQLITE_PRAGMAS:
+            async with conn.execute(pragma):
+                pass
+        await migrate(conn, MIGRATION_DIR)
+        await restore_suspended_triggers(conn)
+        return await generate(conn, count, seed, **kwargs)
+
+
+def run_generate():
+    import argparse
+    import asyncio
+
+    from starlette.config import Config
+
+    config = Config()
+    parser = argparse.ArgumentParser(description="Fill a database with deterministic synthetic news items for scale testing.")
+    parser.add_argument("size", help=f"Number of news items, or one of the presets {', '.join(PRESETS)}.")
+    parser.add_argument("--database", default=config("DATABASE_PATH", default="./db.sqlite3"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--years", type=float, default=5.0, help="Years over which publish times are spread.")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="Rows inserted per transaction.")
+    args = parser.parse_args()
+    if args.size.lower() in PRESETS:
+        count = PRESETS[args.size.lower()]
+    elif args.size.isdigit():
+        count = int(args.size)
+    else:
+        parser.error(f"size must be a number or one of {', '.join(PRESETS)}")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    start = time.perf_counter()
+    counts = asyncio.run(run_generate_async(args.database, count, args.seed, batch_size=args.batch_size, years=args.years))
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"Generated {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s): {counts}")
+
+
+if __name__ == "__main__":
+    run_generate()
@@ -0,0 +1,210 @@
+import contextlib
+import csv
+import itertools
+import logging
+import os
+import socket
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+import aiosqlite
+import orjson
+
+from simple_web_app.maintenance import FTS_TABLE, rebuild_fts, restore_suspended_triggers
+from simple_web_app.migration import migrate
+
+logger = logging.getLogger(__name__)
+
+# Tables which can be loaded, in the order they are loaded in so that foreign keys refer to existing rows.
+TABLES = ["category", "news_item", "news_item_category"]
+
+
+def read_records(path: Path) -> Iterator[dict[str, Any]]:
+    """
+    Stream the records of a JSONL (`.jsonl`/`.ndjson`) or CSV (`.csv`, with a header row) file as dicts.
+
+    Empty CSV fields are read as NULL.
+    """
+    if path.suffix == ".csv":
+        with path.open(newline="", encoding="utf-8") as f:
+            for record in csv.DictReader(f):
+                yield {k: v if v != "" else None for k, v in record.items()}
+    elif path.suffix in (".jsonl", ".ndjson"):
+        with path.open("rb") as f:
+            for line in f:
+                if line.strip():
+                    yield orjson.loads(line)
+    else:
+        raise ValueError(f"Unsupported file type {path.suffix!r} of {path}, expected .jsonl, .ndjson or .csv")
+
+
+def to_rows(records: Iterable[dict[str, Any]], columns: list[str]) -> Iterator[tuple]:
+    for record in records:
+        yield tuple(record.get(column) for column in columns)
+
+
+async def get_table_columns(conn: aiosqlite.Connection, table: str) -> list[str]:
+    result = await conn.execute(f"PRAGMA table_info({table});")
+    return [row[1] for row in await result.fetchall()]
+
+
+async def ingest_file(conn: aiosqlite.Connection, table: str, path: Path, batch_size: int = 10_000, ignore_existing: bool = False) -> int:
+    """
+    Insert the records of a file into `table`, committing every `batch_size` rows. Returns the number of rows read.
+
+    Columns are taken from the keys of the first record; keys which aren't columns of the table are ignored.
+
+    @param bool ignore_existing: Skip records which conflict with existing rows, e.g. to resume an interrupted load.
+    """
+    records = read_records(path)
+    first = next(records, None)
+    if first is None:
+        return 0
+    table_columns = await get_table_columns(conn, table)
+    columns = [column for column in table_columns if column in first]
+    unknown = [key for key in first if key not in table_columns]
+    if unknown:
+        logger.warning(f"Ignoring fields {unknown} of {path}, which aren't columns of {table}.")
+
+    rows = to_rows(itertools.chain([first], records), columns)
+    return await insert_rows(conn, table, columns, rows, batch_size=batch_size, ignore_existing=ignore_existing)
+
+
+async def insert_rows(
+    conn: aiosqlite.Connection,
+    table: str,
+    columns: list[str],
+    rows: Iterable[tuple],
+    batch_size: int = 10_000,
+    ignore_existing: bool = False,
+) -> int:
+    """
+    Insert rows of values for `columns` into `table`, committing every `batch_size` rows. Returns the number of rows.
+
+    A batch which fails is rolled back, but batches committed before it are kept.
+    """
+    sql = (
+        f"INSERT {'OR IGNORE ' if ignore_existing else ''}INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['?'] * len(columns))});"
+    )
+    count = 0
+    for batch in itertools.batched(rows, batch_size):
+        await conn.execute("BEGIN TRANSACTION")
+        try:
+            await conn.executemany(sql, batch)
+            await conn.execute("COMMIT TRANSACTION")
+        except Exception:
+            await conn.execute("ROLLBACK")
+            raise
+        count += len(batch)
+        logger.debug(f"Inserted {count} rows into {table}.")
+    return count
+
+
+@contextlib.asynccontextmanager
+async def suspended_fts_triggers(conn: aiosqlite.Connection, table: str = "news_item", fts_table: str = FTS_TABLE):
+    """
+    Drop the triggers keeping `fts_table` in sync with `table` for the duration of the block, then recreate them
+    from their original SQL and rebuild the full-text index once, which is much faster than updating it row by row.
+
+    The dropped triggers are recorded in the suspended_trigger table in the same transaction, with this process as
+    their owner, so that the app restores them at startup if the process is killed before it does. The index is rebuilt even if the block
+    fails, since batches committed before the failure aren't indexed.
+    """
+    result = await conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?;", [table])
+    triggers = [(name, sql) for name, sql in await result.fetchall() if fts_table in sql]
+    await conn.execute("BEGIN TRANSACTION")
+    try:
+        await conn.executemany(
+            "INSERT INTO suspended_trigger (name, sql, owner_host, owner_pid) VALUES (?, ?, ?, ?);",
+            [(name, sql, socket.gethostname(), os.getpid()) for name, sql in triggers],
+        )
+        for name, _ in triggers:
+            await conn.execute(f"DROP TRIGGER {name};")
+        await conn.execute("COMMIT TRANSACTION")
+    except Exception:
+        await conn.execute("ROLLBACK")
+        raise
+    try:
+        yield
+    finally:
+        # Restoring rebuilds the index, unless the triggers were already restored by someone else.
+        if not await restore_suspended_triggers(conn, expected=True):
+            await rebuild_fts(conn, fts_table)
+
+
+async def ingest(
+    conn: aiosqlite.Connection,
+    files: dict[str, list[Path]],
+    batch_size: int = 10_000,
+    suspend_fts_triggers: bool = False,
+    ignore_existing: bool = False,
+) -> dict[str, int]:
+    """
+    Load files of records into their tables in foreign key order. Returns the number of rows read per table.
+
+    @param dict files: Table name: paths of the files to load into it.
+    @param bool suspend_fts_triggers: Rebuild the full-text index once at the end instead of updating it per row.
+    """
+    counts = {}
+    async with contextlib.AsyncExitStack() as stack:
+        if suspend_fts_triggers and files.get("news_item"):
+            await stack.enter_async_context(suspended_fts_triggers(conn))
+        for table in TABLES:
+            for path in files.get(table, []):
+                start = time.perf_counter()
+                count = await ingest_file(conn, table, path, batch_size=batch_size, ignore_existing=ignore_existing)
+                elapsed = time.perf_counter() - start
+                logger.info(f"Loaded {count} rows from {path} into {table} in {elapsed:.1f}s ({count / elapsed:.0f} rows/s).")
+                counts[table] = counts.get(table, 0) + count
+    return counts
+
+
+async def run_ingest_async(database_path: str, files: dict[str, list[Path]], **kwargs) -> dict[str, int]:
+    from simple_web_app.app import MIGRATION_DIR, SQLITE_PRAGMAS
+
+    async with aiosqlite.connect(database_path, autocommit=True) as conn:
+        for pragma in SQLITE_PRAGMAS:
+            async with conn.execute(pragma):
+                pass
+        await migrate(conn, MIGRATION_DIR)
+        await restore_suspended_triggers(conn)
+        return await ingest(conn, files, **kwargs)
+
+
+def run_ingest():
+    import argparse
+    import asyncio
+
+    from starlette.config import Config
+
+    config = Config()
+    parser = argparse.ArgumentParser(description="Bulk load news items and categories from JSONL or CSV files.")
+    parser.add_argument("--database", default=config("DATABASE_PATH", default="./db.sqlite3"))
+    parser.add_argument("--categories", type=Path, action="append", default=[], help="File of category rows.")
+    parser.add_argument("--news-items", type=Path, action="append", default=[], help="File of news_item rows.")
+    parser.add_argument("--news-item-categories", type=Path, action="append", default=[], help="File of news_item_category rows.")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="Rows inserted per transaction.")
+    parser.add_argument("--suspend-fts-triggers", action="store_true", help="Rebuild the full-text index once at the end.")
+    parser.add_argument("--ignore-existing", action="store_true", help="Skip rows which conflict with existing ones.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    files = {"category": args.categories, "news_item": args.news_items, "news_item_category": args.news_item_categories}
+    start = time.perf_counter()
+    counts = asyncio.run(run_ingest_async(
+        args.database,
+        files,
+        batch_size=args.batch_size,
+        suspend_fts_triggers=args.suspend_fts_triggers,
+        ignore_existing=args.ignore_existing,
+    ))
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"Loaded {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s): {counts}")
+
+
+if __name__ == "__main__":
+    run_ingest()
@@ -1,5 +1,6 @@
+import copy
 import logging
-import json
+import logging.handlers
 
 import orjson
 
@@ -31,10 +32,10 @@ class JsonFormatter(logging.Formatter):
         """
         return {fmt_key: record.__dict__[fmt_val] for fmt_key, fmt_val in self.fmt_dict.items()}
 
-    def format(self, record) -> str:
+    def format_bytes(self, record) -> bytes:
         """
-        Mostly the same as the parent's class method, the difference being that a dict is manipulated and dumped as JSON
-        instead of a string.
+        Mostly the same as the parent's `format` method, the difference being that a dict is manipulated and dumped
+        as JSON bytes instead of a string.
         """
         record.message = record.getMessage()
         
@@ -55,5 +56,68 @@ class JsonFormatter(logging.Formatter):
         if record.stack_info:
             message_dict["stack_info"] = self.formatStack(record.stack_info)
 
-        return json.dumps(message_dict, default=str)
+        return orjson.dumps(message_dict, default=str)
+
+    def format(self, record) -> str:
+        return self.format_bytes(record).decode()
+
+
+class BytesStreamHandler(logging.StreamHandler):
+    """
+    StreamHandler writing to a binary stream such as `sys.stdout.buffer`. Records formatted by a JsonFormatter are
+    written as the bytes orjson produced, without decoding and re-encoding them; any other formatter's output is
+    encoded as UTF-8.
+    """
+    terminator = b"\n"
+
+    def emit(self, record):
+        try:
+            if isinstance(self.formatter, JsonFormatter):
+                data = self.formatter.format_bytes(record)
+            else:
+                data = self.format(record).encode()
+            self.stream.write(data + self.terminator)
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
 
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler which hands records over to its listener's thread, so that logging on the event loop only has to
+    put the record on a queue instead of waiting for the write to stdout.
+
+    Unlike the stdlib's, the traceback and stack are kept apart from the message, so that a JsonFormatter still puts
+    them under their own keys. Closing the handler, which `logging.shutdown` does at exit, stops the listener once
+    it has written every queued record.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # The traceback object can't be used once the exception has been handled, the text has all of it.
+        record.exc_info = None
+        return record
+
+    def close(self):
+        listener = getattr(self, "listener", None)
+        if listener is not None:
+            listener.stop()
+        super().close()
+
+
+class QueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener which starts its thread as soon as it is created, since `logging.config.dictConfig` creates the
+    listener of a QueueHandler configured with `handlers` but doesn't start it.
+
+        "queue": {"class": "simple_web_app.log.QueueHandler", "handlers": ["stdout"], "listener": "simple_web_app.log.QueueListener"}
+    """
+    def __init__(self, queue, *handlers, respect_handler_level: bool = False):
+        super().__init__(queue, *handlers, respect_handler_level=respect_handler_level)
+        self.start()
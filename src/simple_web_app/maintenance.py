@@ -0,0 +1,321 @@
+import asyncio
+import dataclasses
+import logging
+import os
+import random
+import socket
+import sqlite3
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import aiosqlite
+
+from simple_web_app.db import Database
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "news_item_fts"
+# Triggers keeping FTS_TABLE in sync with news_item.
+FTS_TRIGGERS = ["news_item_ai", "news_item_au", "news_item_ad"]
+
+
+async def _total_changes(conn: aiosqlite.Connection) -> int:
+    result = await conn.execute("SELECT total_changes();")
+    (changes,) = await result.fetchone()
+    return changes
+
+
+async def fts_merge_step(conn: aiosqlite.Connection, pages: int = 500, fts_table: str = FTS_TABLE) -> bool:
+    """
+    Run one incremental FTS5 'merge' step, writing about `pages` pages of index b-tree segments into larger ones.
+    Returns whether there was anything left to merge.
+
+    Every update to the index adds a segment, and a query has to read every segment which contains its terms, so
+    merging keeps search latency from creeping up as articles are added and edited.
+    """
+    before = await _total_changes(conn)
+    await conn.execute(f"INSERT INTO {fts_table}({fts_table}, rank) VALUES ('merge', ?);", [pages])
+    # The merge command only writes rows if it did any work, see https://sqlite.org/fts5.html#the_merge_command
+    return await _total_changes(conn) - before >= 2
+
+
+async def fts_merge(conn: aiosqlite.Connection, pages: int = 500, max_steps: int | None = None, fts_table: str = FTS_TABLE) -> int:
+    """
+    Merge the FTS5 index in small steps until there is nothing left to merge, or `max_steps` steps have run.
+    Each step is its own transaction, and the event loop is yielded to in between, so that other writers aren't
+    blocked for the whole merge. Returns the number of steps which did any work.
+    """
+    steps = 0
+    while max_steps is None or steps < max_steps:
+        if not await fts_merge_step(conn, pages, fts_table):
+            break
+        steps += 1
+        await asyncio.sleep(0)
+    return steps
+
+
+async def fts_optimize(conn: aiosqlite.Connection, fts_table: str = FTS_TABLE) -> None:
+    """
+    Merge the whole FTS5 index into a single segment. This rewrites the entire index in one transaction, so prefer
+    `fts_merge` on a live database.
+    """
+    await conn.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('optimize');")
+
+
+async def fts_integrity_check(conn: aiosqlite.Connection, fts_table: str = FTS_TABLE) -> bool:
+    """
+    Check that the FTS5 index is internally consistent and matches the rows of its content table.
+    """
+    try:
+        await conn.execute(f"INSERT INTO {fts_table}({fts_table}, rank) VALUES ('integrity-check', 1);")
+    except sqlite3.DatabaseError as e:
+        logger.error(f"Integrity check of {fts_table} failed: {e}")
+        return False
+    return True
+
+
+async def check_fts_triggers(conn: aiosqlite.Connection) -> bool:
+    """
+    Check that the triggers keeping the FTS5 index in sync exist. Without them, edits to news items are silently
+    left out of search results.
+    """
+    result = await conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger';")
+    existing = {row[0] for row in await result.fetchall()}
+    missing = [name for name in FTS_TRIGGERS if name not in existing]
+    if missing:
+        logger.error(f"Triggers {missing} keeping {FTS_TABLE} in sync are missing, run `simple-web-app-maintenance restore-triggers`.")
+    return not missing
+
+
+async def integrity_check(conn: aiosqlite.Connection) -> bool:
+    """
+    Run SQLite's integrity check on the whole database, as well as the FTS5 integrity check and a check that the
+    FTS5 triggers exist.
+    """
+    result = await conn.execute("PRAGMA integrity_check;")
+    errors = [row[0] for row in await result.fetchall() if row[0] != "ok"]
+    for error in errors:
+        logger.error(f"Integrity check failed: {error}")
+    fts_ok = await fts_integrity_check(conn)
+    triggers_ok = await check_fts_triggers(conn)
+    return fts_ok and triggers_ok and not errors
+
+
+async def rebuild_fts(conn: aiosqlite.Connection, fts_table: str = FTS_TABLE) -> None:
+    start = time.perf_counter()
+    await conn.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild');")
+    logger.info(f"Rebuilt {fts_table} in {time.perf_counter() - start:.1f}s.")
+
+
+def is_running(host: str | None, pid: int | None) -> bool:
+    """
+    Whether the process `pid` on `host` may still be running. Processes on other hosts, or which weren't recorded,
+    can't be checked, so are assumed to be. A pid which has since been reused also counts as running.
+    """
+    if host != socket.gethostname() or pid is None:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+async def restore_suspended_triggers(conn: aiosqlite.Connection, expected: bool = False, force: bool = False) -> list[str]:
+    """
+    Recreate the triggers recorded in the suspended_trigger table by a bulk load, and rebuild the FTS5 index if
+    there were any. Run at startup, so that a load which was killed before restoring them doesn't leave the index
+    permanently out of sync. Triggers suspended by a load which may still be running are left to it, since
+    restoring them would rebuild the index while it's loading. Returns the names of the restored triggers.
+
+    @param bool expected: Whether this is the load restoring its own triggers, rather than recovering from a load
+        which didn't, which is logged as a warning.
+    @param bool force: Restore the triggers even if the load which suspended them may still be running.
+    """
+    result = await conn.execute("SELECT name, sql, owner_host, owner_pid FROM suspended_trigger;")
+    rows = await result.fetchall()
+    if not rows:
+        return []
+    owners = {(host, pid) for _, _, host, pid in rows}
+    if not (expected or force) and any(is_running(host, pid) for host, pid in owners):
+        logger.warning(
+            f"Triggers {[name for name, *_ in rows]} are suspended by a load which may still be running "
+            f"(host, pid: {sorted(owners, key=str)}), restore them with `simple-web-app-maintenance restore-triggers` "
+            "if it isn't."
+        )
+        return []
+    triggers = [(name, sql) for name, sql, _, _ in rows]
+    await conn.execute("BEGIN TRANSACTION")
+    try:
+        for _, sql in triggers:
+            await conn.execute(sql)
+        await conn.execute("DELETE FROM suspended_trigger;")
+        await conn.execute("COMMIT TRANSACTION")
+    except Exception:
+        await conn.execute("ROLLBACK")
+        raise
+    names = [name for name, _ in triggers]
+    logger.log(logging.INFO if expected else logging.WARNING, f"Restored suspended triggers {names}.")
+    await rebuild_fts(conn)
+    return names
+
+
+async def checkpoint_wal(db: Database, size_threshold: int) -> str:
+    """
+    Checkpoint the WAL back into the database file once it has grown past `size_threshold` bytes.
+
+    A passive checkpoint copies as many frames as it can without waiting for readers. Only once it has copied all
+    of them is the WAL truncated, which is then quick, so that the file shrinks back instead of staying at its
+    largest size on disk.
+    """
+    wal_path = f"{db.path}-wal"
+    try:
+        wal_size = os.path.getsize(wal_path)
+    except OSError:
+        return "no WAL file"
+    if wal_size < size_threshold:
+        return f"WAL is {wal_size} bytes"
+    async with db.writer() as conn:
+        async with conn.execute("PRAGMA wal_checkpoint(PASSIVE);") as result:
+            busy, log_frames, checkpointed_frames = await result.fetchone()
+        if busy or checkpointed_frames < log_frames:
+            return f"checkpointed {checkpointed_frames} of {log_frames} frames of a {wal_size} byte WAL"
+        async with conn.execute("PRAGMA wal_checkpoint(TRUNCATE);"):
+            pass
+    return f"checkpointed and truncated a {wal_size} byte WAL"
+
+
+async def optimize(db: Database, analysis_limit: int = 1000) -> None:
+    """
+    Refresh the query planner's statistics, sampling at most `analysis_limit` rows of each index.
+
+    `PRAGMA optimize` only considers tables queried through the connection it runs on unless given the 0x10000
+    flag, which SQLite added in 3.46. This runs on the writer while the queries run on readers, so older
+    versions, which ignore the flag and would analyse nothing, run `ANALYZE` on every table instead.
+    """
+    async with db.writer() as conn:
+        async with conn.execute(f"PRAGMA analysis_limit = {int(analysis_limit)};"):
+            pass
+        if sqlite3.sqlite_version_info >= (3, 46, 0):
+            async with conn.execute("PRAGMA optimize = 0x10002;"):
+                pass
+        else:
+            async with conn.execute("ANALYZE;"):
+                pass
+
+
+async def merge_fts(db: Database, pages: int = 500, max_steps: int = 20) -> int:
+    """
+    Incrementally merge the FTS5 index, taking the writer for one step at a time so that requests writing to the
+    database only wait for a single step.
+    """
+    steps = 0
+    while steps < max_steps:
+        async with db.writer() as conn:
+            if not await fts_merge_step(conn, pages):
+                break
+        steps += 1
+    return steps
+
+
+@dataclasses.dataclass
+class MaintenanceJob:
+    name: str
+    interval: float
+    run: Callable[[], Awaitable[Any]]
+
+
+class MaintenanceScheduler:
+    """
+    Runs maintenance jobs in the background, each every `interval` seconds give or take `jitter` (a fraction of
+    the interval), until the scheduler is stopped. Jobs with an interval of 0 or less are not run.
+
+    Only one process should run the jobs for a database: the launcher runs them in a single worker (see
+    RUN_MAINTENANCE). The jitter keeps jobs with the same interval from all running at once. A job which raises
+    is logged and run again at its next interval.
+
+        async with MaintenanceScheduler([MaintenanceJob("optimize", 3600, lambda: optimize(db))]):
+            ...
+    """
+    def __init__(self, jobs: list[MaintenanceJob], jitter: float = 0.1):
+        self.jobs = [job for job in jobs if job.interval > 0]
+        self.jitter = jitter
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._run_periodically(job), name=f"maintenance-{job.name}") for job in self.jobs]
+        if self.jobs:
+            logger.info(f"Scheduled maintenance jobs: {', '.join(f'{job.name} every {job.interval:g}s' for job in self.jobs)}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def __aenter__(self) -> "MaintenanceScheduler":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def _run_periodically(self, job: MaintenanceJob) -> None:
+        while True:
+            await asyncio.sleep(job.interval * random.uniform(1 - self.jitter, 1 + self.jitter))
+            await self.run_job(job)
+
+    async def run_job(self, job: MaintenanceJob) -> None:
+        start = time.perf_counter()
+        try:
+            result = await job.run()
+        except Exception:
+            logger.exception(f"Maintenance job {job.name} failed after {time.perf_counter() - start:.3f}s")
+            return
+        logger.info(f"Maintenance job {job.name} took {time.perf_counter() - start:.3f}s" + (f": {result}" if result is not None else ""))
+
+
+async def run_maintenance_async(database_path: str, command: str, pages: int = 500) -> bool:
+    async with aiosqlite.connect(database_path, autocommit=True) as conn:
+        start = time.perf_counter()
+        ok = True
+        if command == "merge":
+            steps = await fts_merge(conn, pages)
+            logger.info(f"Ran {steps} merge steps.")
+        elif command == "optimize":
+            await fts_optimize(conn)
+        elif command == "integrity-check":
+            ok = await integrity_check(conn)
+            logger.info(f"Integrity check {'passed' if ok else 'failed'}.")
+        elif command == "rebuild":
+            await rebuild_fts(conn)
+        elif command == "restore-triggers":
+            await restore_suspended_triggers(conn, force=True)
+            ok = await check_fts_triggers(conn)
+        logger.info(f"Finished {command} in {time.perf_counter() - start:.1f}s.")
+        return ok
+
+
+def run_maintenance():
+    import argparse
+    import sys
+
+    from starlette.config import Config
+
+    config = Config()
+    parser = argparse.ArgumentParser(description="Maintain the full-text search index.")
+    parser.add_argument("command", choices=["merge", "optimize", "integrity-check", "rebuild", "restore-triggers"])
+    parser.add_argument("--database", default=config("DATABASE_PATH", default="./db.sqlite3"))
+    parser.add_argument("--pages", type=int, default=500, help="Pages written per merge step.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    ok = asyncio.run(run_maintenance_async(args.database, args.command, args.pages))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    run_maintenance()
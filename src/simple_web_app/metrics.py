@@ -0,0 +1,331 @@
+import asyncio
+import bisect
+import contextlib
+import fcntl
+import functools
+import math
+import os
+import time
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+# Default histogram buckets in seconds, from well under a millisecond for cached pages up to slow full page loads.
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[Any]) -> str:
+    labels = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values, strict=True))
+    return f"{{{labels}}}" if labels else ""
+
+
+def _add_label(labels: str, name: str, value: Any) -> str:
+    label = _format_labels([name], [value])
+    return f"{labels[:-1]},{label[1:]}" if labels else label
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class Metric:
+    """
+    A metric in the Prometheus text exposition format, with one value per combination of label values.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        """
+        Yield the (name, formatted labels, value) of every sample of the metric.
+        """
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return _render(self.name, self.help, self.type, self.samples())
+
+
+def _render(name: str, help: str, type: str, samples: Iterable[tuple[str, str, float]]) -> str:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+    lines += [f"{sample}{labels} {_format_value(value)}" for sample, labels, value in samples]
+    return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        for labelvalues, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, labelvalues), value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labelvalues, amount: float = 1) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, *labelvalues, value: float) -> None:
+        self._values[labelvalues] = value
+
+
+class Histogram(Metric):
+    """
+    Counts observations into buckets of their upper bounds, along with their sum and count, so that Prometheus can
+    estimate quantiles (e.g. the p99 latency) across any number of processes and time ranges.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = REQUEST_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Label values: [count per bucket (the last one being +Inf), sum].
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labelvalues) -> None:
+        entry = self._values.get(labelvalues)
+        if entry is None:
+            entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        for labelvalues, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                labels = _format_labels((*self.labelnames, "le"), (*labelvalues, _format_value(float(bound))))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class CallbackMetric(Metric):
+    """
+    Metric whose values are read when it is rendered, from stats which are already kept elsewhere (e.g. PoolStats).
+
+    @param callable collect: Returns label values: value.
+    """
+    def __init__(self, name: str, help: str, type: str, labelnames: Iterable[str], collect: Callable[[], dict[tuple, float]]):
+        super().__init__(name, help, labelnames)
+        self.type = type
+        self.collect = collect
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        for labelvalues, value in self.collect().items():
+            yield self.name, _format_labels(self.labelnames, labelvalues), value
+
+
+class Registry:
+    """
+    The metrics of this process, rendered in the Prometheus text format by `render()`.
+
+    Registering a metric under a name which is already taken replaces the old one, so that the app's lifespan can
+    register callbacks reading its current database and caches every time it starts.
+    """
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register[M: Metric](self, metric: M) -> M:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = REQUEST_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, type: str, labelnames: Iterable[str], collect: Callable[[], dict[tuple, float]]) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, type, labelnames, collect))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+class MultiProcessRegistry(Registry):
+    """
+    Registry whose `render()` includes the metrics of every worker process sharing `directory`, so that a scrape
+    answered by any of them covers the whole server.
+
+    Each process writes a snapshot of its metrics to `<pid>.json` in `directory` every `flush_interval` seconds
+    while it's entered as an async context manager, and when it renders them. Counters and histograms are summed across processes.
+    Gauges are kept per process, with a `worker` label holding its pid, as their sum isn't always meaningful (e.g.
+    a hit ratio). The snapshots of processes which have exited are left behind, then their counters and
+    histograms are added to `archive.json` by the next render, so that the totals never go down when a worker is
+    restarted, which Prometheus would read as a reset.
+    """
+    ARCHIVE = "archive.json"
+
+    def __init__(self, directory: str | Path, flush_interval: float = 5.0):
+        super().__init__()
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.pid = os.getpid()
+        self._flushed = False
+        self._task: asyncio.Task | None = None
+
+    @property
+    def path(self) -> Path:
+        return self.directory / f"{self.pid}.json"
+
+    def snapshot(self) -> list[dict]:
+        return [
+            {"name": metric.name, "help": metric.help, "type": metric.type, "samples": list(metric.samples())}
+            for metric in self._metrics.values()
+        ]
+
+    def flush(self) -> None:
+        """
+        Write this process's snapshot, replacing the previous one in a single step so that readers never see half
+        of it.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not self._flushed and self.path.exists():
+            # Left by an exited process whose pid has been reused.
+            self._archive(self.path)
+        self._flushed = True
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_bytes(orjson.dumps(self.snapshot()))
+        os.replace(tmp_path, self.path)
+
+    @contextlib.contextmanager
+    def _lock(self) -> Iterator[None]:
+        with open(self.directory / "lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _archive(self, path: Path) -> None:
+        """
+        Add the counters and histograms of the exited process whose snapshot is `path` to the archive, and remove it.
+        """
+        with self._lock():
+            try:
+                snapshot = orjson.loads(path.read_bytes())
+            except FileNotFoundError:
+                # Archived by another process in the meantime.
+                return
+            archive_path = self.directory / self.ARCHIVE
+            archive = orjson.loads(archive_path.read_bytes()) if archive_path.exists() else []
+            merged = self._merge([(None, archive), (None, [m for m in snapshot if m["type"] != "gauge"])])
+            tmp_path = archive_path.with_suffix(".tmp")
+            tmp_path.write_bytes(orjson.dumps([
+                {"name": name, "help": help, "type": type, "samples": [[*key, value] for key, value in samples.items()]}
+                for name, (help, type, samples) in merged.items()
+            ]))
+            os.replace(tmp_path, archive_path)
+            path.unlink()
+
+    @staticmethod
+    def _merge(snapshots: Iterable[tuple[int | None, list[dict]]]) -> dict[str, tuple[str, str, dict[tuple[str, str], float]]]:
+        # Metric name: (help, type, (sample name, labels): value).
+        merged = {}
+        for pid, snapshot in snapshots:
+            for metric in snapshot:
+                _, _, samples = merged.setdefault(metric["name"], (metric["help"], metric["type"], {}))
+                for name, labels, value in metric["samples"]:
+                    if metric["type"] == "gauge":
+                        samples[name, _add_label(labels, "worker", pid)] = value
+                    else:
+                        samples[name, labels] = samples.get((name, labels), 0) + value
+        return merged
+
+    def render(self) -> str:
+        self.flush()
+        snapshots = []
+        for path in self.directory.glob("*.json"):
+            if path.stem.isdigit() and not _is_running(int(path.stem)):
+                self._archive(path)
+        for path in sorted(self.directory.glob("*.json")):
+            if path.name != self.ARCHIVE and not path.stem.isdigit():
+                continue
+            pid = int(path.stem) if path.stem.isdigit() else None
+            try:
+                snapshots.append((pid, orjson.loads(path.read_bytes())))
+            except FileNotFoundError:
+                continue
+        merged = self._merge(snapshots)
+        return "\n".join(
+            _render(name, help, type, ((sample, labels, value) for (sample, labels), value in samples.items()))
+            for name, (help, type, samples) in merged.items()
+        ) + "\n"
+
+    async def __aenter__(self) -> "MultiProcessRegistry":
+        self._task = asyncio.create_task(self._flush_periodically(), name="metrics-flush")
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self.flush()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            self.flush()
+            await asyncio.sleep(self.flush_interval)
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def instrument_queries(queries, registry: Registry):
+    """
+    Wrap every query function of an aiosql `Queries` object to record its latency and the number of rows it returns.
+    The `_cursor` variants, which return context managers, are left alone.
+    """
+    duration = registry.histogram("db_query_duration_seconds", "Time spent running each named query.", ["query"], buckets=QUERY_BUCKETS)
+    rows = registry.counter("db_query_rows_total", "Rows returned by each named query.", ["query"])
+
+    def instrument(name: str, fn):
+        @functools.wraps(fn)
+        async def instrumented(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            finally:
+                duration.observe(time.perf_counter() - start, name)
+            if isinstance(result, list):
+                rows.inc(name, amount=len(result))
+            return result
+        return instrumented
+
+    for name in queries.available_queries:
+        if not name.endswith("_cursor"):
+            setattr(queries, name, instrument(name, getattr(queries, name)))
+    return queries
@@ -0,0 +1,280 @@
+import hashlib
+import logging
+import time
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware import gzip as starlette_gzip
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from simple_web_app.metrics import Registry
+from simple_web_app.profiling import RequestProfile, current_profile
+
+logger = logging.getLogger(__name__)
+
+# Headers which are kept on a 304 response, see RFC 9110 section 15.4.5.
+NOT_MODIFIED_HEADERS = {"cache-control", "content-location", "date", "etag", "expires", "vary"}
+
+
+def compute_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Weak comparison of an ETag against an If-None-Match header, as If-None-Match requires.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class ConditionalGetMiddleware:
+    """
+    Adds a strong ETag to complete 200 responses to GET and HEAD requests, and answers requests whose
+    If-None-Match matches it with an empty 304 response.
+
+    Responses which already carry an ETag (e.g. ones served from the fragment cache, or static files) keep it,
+    so their body isn't hashed again. Streamed responses are passed through untouched.
+    Responses to HTMX preload requests are also marked as cacheable by the browser for a minute.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        is_preloaded = request_headers.get("hx-preloaded") == "true"
+        if_none_match = request_headers.get("if-none-match")
+        start_message: Message | None = None
+
+        async def send_with_etag(message: Message) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                if is_preloaded:
+                    MutableHeaders(scope=message)["cache-control"] = "private, max-age=60"
+                # Hold on to the start of the response until we know whether the body is complete.
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            if start["status"] == 200 and not message.get("more_body", False):
+                headers = MutableHeaders(scope=start)
+                etag = headers.get("etag")
+                if etag is None:
+                    etag = compute_etag(message.get("body", b""))
+                    headers["etag"] = etag
+                if if_none_match is not None and etag_matches(if_none_match, etag):
+                    await send({
+                        "type": "http.response.start",
+                        "status": 304,
+                        "headers": [(k, v) for k, v in start["headers"] if k.decode("latin-1") in NOT_MODIFIED_HEADERS],
+                    })
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
+
+
+def negotiate_encoding(accept_encoding: str, available: list[str]) -> str | None:
+    """
+    Pick the content coding to respond with from an Accept-Encoding header.
+
+    Codings are chosen by the client's q-value, then by their order in `available`. Returns None if the client
+    accepts none of them.
+    """
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, *params = part.strip().split(";")
+        q = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.strip().lower()] = q
+    wildcard = qualities.get("*", 0.0)
+    candidates = [(qualities.get(coding, wildcard), -i, coding) for i, coding in enumerate(available)]
+    q, _, coding = max(candidates, default=(0.0, 0, None))
+    return coding if q > 0 else None
+
+
+# The responders below build on undocumented internals of starlette.middleware.gzip (IdentityResponder,
+# send_with_compression, apply_compression and content_encoding), so pyproject.toml pins starlette to a minor version
+# they are known to work with.
+class _ForwardOtherMessagesMixin:
+    """
+    Starlette's responders drop messages other than the response start and body, such as the
+    "http.response.debug" message TemplateResponse sends to test clients.
+    """
+    async def send_with_compression(self, message: Message) -> None:
+        if message["type"] not in ("http.response.start", "http.response.body", "http.response.pathsend"):
+            await self.send(message)
+            return
+        await super().send_with_compression(message)
+
+
+class GZipResponder(_ForwardOtherMessagesMixin, starlette_gzip.GZipResponder):
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            # Starlette's leaves small chunks in the compressor's buffer until the response ends.
+            self.gzip_file.write(body)
+            self.gzip_file.flush()
+            body = self.gzip_buffer.getvalue()
+            self.gzip_buffer.seek(0)
+            self.gzip_buffer.truncate()
+            return body
+        return super().apply_compression(body, more_body=more_body)
+
+
+class BrotliResponder(_ForwardOtherMessagesMixin, starlette_gzip.IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = 4) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            # Flush so that each chunk of a streamed response reaches the client as soon as it is sent.
+            return self.compressor.process(body) + self.compressor.flush()
+        return self.compressor.process(body) + self.compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli or gzip, whichever the client prefers, if they are at least `minimum_size`
+    bytes. Responses which are already encoded, such as precompressed static files, are passed through.
+
+    A compressed body is a different representation than the uncompressed one, so a strong ETag on it is
+    made weak, which still matches If-None-Match. So is the ETag of a 304 to a client which accepts compression,
+    which also varies on Accept-Encoding like the response it validates.
+    """
+    encodings = ["br", "gzip"]
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding == "br":
+            responder = BrotliResponder(self.app, self.minimum_size, quality=self.brotli_quality)
+        elif encoding == "gzip":
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_weak_etag(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                etag = headers.get("etag")
+                # A 304 has no body to compress, but stands in for the compressed 200 the client has cached.
+                not_modified = message["status"] == 304
+                if not_modified:
+                    headers.add_vary_header("Accept-Encoding")
+                if etag is not None and not etag.startswith("W/") and (not_modified or headers.get("content-encoding") == responder.content_encoding):
+                    headers["etag"] = f"W/{etag}"
+            await send(message)
+
+        await responder(scope, receive, send_with_weak_etag)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status and number of in-flight requests per route in `registry`.
+
+    Requests are labelled with the path template of the route which handled them (e.g. "/static" rather than the
+    path of each file), looked up from the endpoint the router stores in the scope, so that the number of series
+    stays bounded. Requests which matched no route are labelled "unmatched". The latency runs until the last body
+    chunk has been sent, so it includes the time spent in the middleware inside this one.
+    """
+    def __init__(self, app: ASGIApp, registry: Registry, routes: list[BaseRoute]):
+        self.app = app
+        self.route_paths = {getattr(route, "endpoint", None) or route.app: route.path for route in routes}
+        self.latency = registry.histogram("http_request_duration_seconds", "Time taken to respond to requests.", ["method", "route"])
+        self.responses = registry.counter("http_responses_total", "Responses sent.", ["method", "route", "status"])
+        self.in_flight = registry.gauge("http_requests_in_flight", "Requests being handled.", ["method"])
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.in_flight.inc(method)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            self.in_flight.dec(method)
+            route = self.route_paths.get(scope.get("endpoint"), "unmatched")
+            self.latency.observe(time.perf_counter() - start, method, route)
+            self.responses.inc(method, route, status)
+
+
+class ProfilingMiddleware:
+    """
+    Collects the named queries each request runs (see `simple_web_app.profiling.profile_queries`), reports them in
+    a Server-Timing header and a summary log line, and warns when a query runs more than `repeated_query_threshold`
+    times in one request. Meant for development, as it logs every request along with its query parameters.
+    """
+    def __init__(self, app: ASGIApp, repeated_query_threshold: int = 3):
+        self.app = app
+        self.repeated_query_threshold = repeated_query_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+
+        async def send_with_server_timing(message: Message) -> None:
+            if message["type"] == "http.response.start" and profile.queries:
+                MutableHeaders(scope=message).append("server-timing", profile.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            current_profile.reset(token)
+            self.report(f"{scope['method']} {scope['path']}", profile)
+
+    def report(self, request: str, profile: RequestProfile) -> None:
+        if not profile.queries:
+            return
+        logger.info(f"{request}: {profile.summary()}")
+        for name, count in profile.repeated_queries(self.repeated_query_threshold).items():
+            logger.warning(f"{request}: {name} ran {count} times, batch it into a single query instead of one per row.")
+        for query in profile.queries:
+            if query.plan is not None:
+                logger.warning(f"{request}: {query.name} took {query.duration * 1000:.2f}ms with {query.parameters}, query plan: {query.plan}")
@@ -17,9 +17,14 @@ async def create_migrations_table_if_not_exists(conn: aiosqlite.Connection) -> N
         await conn.commit()
 
 
-async def apply_migrations(conn: aiosqlite.Connection, migration_queries: list[str]) -> None:
+async def get_db_version(conn: aiosqlite.Connection) -> int:
     result = await conn.execute("SELECT version FROM migration_version")
     (db_version,) = await result.fetchone()
+    return db_version
+
+
+async def apply_migrations(conn: aiosqlite.Connection, migration_queries: list[str]) -> None:
+    db_version = await get_db_version(conn)
     num_migrations = len(migration_queries)
     for i in range(db_version, num_migrations):
         query = migration_queries[i]
@@ -35,6 +40,15 @@ async def apply_migrations(conn: aiosqlite.Connection, migration_queries: list[s
             raise
 
 
+async def migrate(conn: aiosqlite.Connection, migrations_dir: Path) -> None:
+    await create_migrations_table_if_not_exists(conn)
+    migration_files = sorted(migrations_dir.glob("*.sql"))
+    # Up to date, as on every start but the first after a deploy, so there's no need to read the migrations.
+    if await get_db_version(conn) >= len(migration_files):
+        return
+    migration_queries = [p.read_text() for p in migration_files]
+    await apply_migrations(conn, migration_queries)
+
 
 def create_migration(name: str, migrations_dir: Path):
     current_timestamp = datetime.datetime.now(tz=datetime.UTC)
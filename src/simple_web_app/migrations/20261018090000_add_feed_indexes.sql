@@ -0,0 +1,5 @@
+-- The feed is ordered by published DESC, id ASC, so the index stores published descending to avoid a sort.
+CREATE INDEX news_item_language_published_id ON news_item (language, published DESC, id);
+
+CREATE INDEX news_item_category_category_id_news_item_id ON news_item_category (category_id, news_item_id);
+CREATE INDEX news_item_category_news_item_id_category_id ON news_item_category (news_item_id, category_id);
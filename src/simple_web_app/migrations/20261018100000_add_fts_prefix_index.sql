@@ -0,0 +1,13 @@
+-- Prefix indexes let search-as-you-type queries like "cli"* look up their terms directly instead of scanning the
+-- vocabulary. FTS5 options can't be altered, so the table is recreated and rebuilt from news_item.
+DROP TABLE news_item_fts;
+
+CREATE VIRTUAL TABLE news_item_fts USING fts5(
+  title,
+  text,
+  content='news_item',
+  content_rowid='id',
+  prefix='2 3 4'
+);
+
+INSERT INTO news_item_fts(news_item_fts) VALUES ('rebuild');
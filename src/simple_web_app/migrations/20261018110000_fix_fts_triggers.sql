@@ -0,0 +1,18 @@
+-- news_item_fts is an external-content table, which can't be updated or deleted from directly: removing a row's
+-- tokens needs the 'delete' command with the values that were indexed. The previous triggers left stale tokens
+-- behind on every edit, so the index is rebuilt after replacing them.
+DROP TRIGGER news_item_au;
+DROP TRIGGER news_item_ad;
+
+CREATE TRIGGER news_item_au AFTER UPDATE OF id, title, text ON news_item BEGIN
+    INSERT INTO news_item_fts(news_item_fts, rowid, title, text)
+    VALUES ('delete', old.id, old.title, old.text);
+    INSERT INTO news_item_fts(rowid, title, text)
+    VALUES (new.id, new.title, new.text);
+END;
+CREATE TRIGGER news_item_ad AFTER DELETE ON news_item BEGIN
+    INSERT INTO news_item_fts(news_item_fts, rowid, title, text)
+    VALUES ('delete', old.id, old.title, old.text);
+END;
+
+INSERT INTO news_item_fts(news_item_fts) VALUES ('rebuild');
@@ -0,0 +1,6 @@
+-- Triggers dropped by a bulk load while it runs (see simple_web_app.ingest), recorded in the same transaction as
+-- the drop so that they can be restored at startup if the load is killed before it recreates them.
+CREATE TABLE suspended_trigger (
+  name TEXT PRIMARY KEY,
+  sql TEXT NOT NULL
+) STRICT;
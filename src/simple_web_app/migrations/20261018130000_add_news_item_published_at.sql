@@ -0,0 +1,16 @@
+-- published is an ISO 8601 string, which the feed compared as text and the home page parsed for every row it
+-- showed. published_at holds the same time as Unix epoch seconds, so the feed filters, orders and formats integers.
+ALTER TABLE news_item ADD COLUMN published_at INTEGER;
+
+UPDATE news_item SET published_at = unixepoch(published);
+
+-- Fill in published_at for writers which only set published, e.g. bulk loads of older exports.
+CREATE TRIGGER news_item_published_at_ai AFTER INSERT ON news_item WHEN new.published_at IS NULL BEGIN
+    UPDATE news_item SET published_at = unixepoch(new.published) WHERE id = new.id;
+END;
+CREATE TRIGGER news_item_published_at_au AFTER UPDATE OF published ON news_item WHEN new.published_at IS old.published_at BEGIN
+    UPDATE news_item SET published_at = unixepoch(new.published) WHERE id = new.id;
+END;
+
+DROP INDEX news_item_language_published_id;
+CREATE INDEX news_item_language_published_at_id ON news_item (language, published_at DESC, id);
@@ -0,0 +1,5 @@
+-- The process which suspended each trigger, so that startup only restores the triggers of a load which is no longer
+-- running, rather than rebuilding the index under the feet of one which is. Rows without an owner were written
+-- before it was recorded, and are only restored by the load itself or the restore-triggers maintenance command.
+ALTER TABLE suspended_trigger ADD COLUMN owner_host TEXT;
+ALTER TABLE suspended_trigger ADD COLUMN owner_pid INTEGER;
@@ -0,0 +1,94 @@
+import re
+
+import jinja2.ext
+
+# Elements whose content is shown or run exactly as written.
+PRESERVED_ELEMENTS = {"pre", "textarea", "script", "style"}
+# Elements next to which whitespace is never rendered: block-level ones, those in the document head, and SVG
+# shapes, which only ever contain or sit between other elements.
+BLOCK_ELEMENTS = {
+    "html", "head", "body", "title", "meta", "link", "script", "style", "base",
+    "main", "header", "footer", "nav", "section", "article", "aside", "div", "p", "hr", "blockquote", "pre",
+    "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "dl", "dt", "dd", "details", "summary", "dialog",
+    "hgroup", "menu", "address", "search",
+    "table", "thead", "tbody", "tfoot", "tr", "th", "td", "caption", "colgroup", "col",
+    "form", "fieldset", "legend", "option", "optgroup", "figure", "figcaption",
+    "path", "g", "defs", "circle", "rect", "line", "polyline", "polygon", "ellipse",
+}
+
+_JINJA = r"\{%-?\s*raw\s*-?%\}.*?\{%-?\s*endraw\s*-?%\}|\{\{.*?\}\}|\{%.*?%\}|\{\#.*?\#\}"
+_TOKEN_RE = re.compile(
+    rf"""
+    (?P<preserved><(?P<preserved_name>{"|".join(PRESERVED_ELEMENTS)})\b.*?</(?P=preserved_name)\s*>)
+    |(?P<jinja>{_JINJA})
+    |(?P<comment><!--(?!\[if).*?-->)
+    |(?P<tag></?(?P<tag_name>[a-zA-Z][\w:-]*)(?:"[^"]*"|'[^']*'|{_JINJA}|[^>"'])*>|<![^>]*>)
+    |(?P<space>\s+)
+    |(?P<text>[^<{{\s]+|.)
+    """,
+    re.DOTALL | re.VERBOSE | re.IGNORECASE,
+)
+# Whitespace between a tag's attributes, outside of quoted values and Jinja tags.
+_TAG_PART_RE = re.compile(rf"""("[^"]*"|'[^']*'|{_JINJA})|\s+""", re.DOTALL)
+# Jinja statements which render something in place.
+_OUTPUT_STATEMENT_RE = re.compile(r"\{%-?\s*(include|call|block)\b")
+
+
+def _minify_tag(tag: str) -> str:
+    tag = _TAG_PART_RE.sub(lambda m: m.group(1) or " ", tag)
+    return re.sub(r"\s+(/?>)$", r"\1", tag)
+
+
+def minify_html(source: str) -> str:
+    """
+    Remove HTML comments and whitespace which doesn't change how an HTML template renders, leaving Jinja tags
+    as they are.
+
+    Runs of whitespace are collapsed to a single space, which browsers render the same, and removed entirely
+    next to block-level tags and at the start and end of the template. The content of pre, textarea, script
+    and style elements, quoted attribute values and conditional comments are kept as written.
+
+        >>> minify_html('<ul>\\n  <li>\\n    <b>Hello</b>\\n    world <!-- greeting -->\\n  </li>\\n</ul>\\n')
+        '<ul><li><b>Hello</b> world</li></ul>'
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(source):
+        kind = next(k for k in ("preserved", "jinja", "comment", "tag", "space", "text") if match.group(k) is not None)
+        if kind == "comment":
+            continue
+        name = (match.group("preserved_name") or match.group("tag_name") or "").lower()
+        text = _minify_tag(match.group()) if kind == "tag" else match.group()
+        if kind == "space" and tokens and tokens[-1][0] == "space":
+            # Whitespace on both sides of a removed comment.
+            continue
+        tokens.append((kind, text, name))
+
+    def is_block(i: int) -> bool:
+        return 0 <= i < len(tokens) and tokens[i][2] in BLOCK_ELEMENTS
+
+    def next_output(i: int, step: int) -> int:
+        # Most Jinja statements and comments render nothing, so look past them for the neighbouring markup.
+        while 0 <= i < len(tokens) and tokens[i][0] == "jinja" and not tokens[i][1].startswith("{{") and not _OUTPUT_STATEMENT_RE.match(tokens[i][1]):
+            i += step
+        return i
+
+    parts = []
+    for i, (kind, text, _) in enumerate(tokens):
+        if kind == "space":
+            before, after = next_output(i - 1, -1), next_output(i + 1, 1)
+            if before < 0 or after >= len(tokens) or is_block(before) or is_block(after):
+                continue
+            text = " "
+        parts.append(text)
+    return "".join(parts)
+
+
+class MinifyHtmlExtension(jinja2.ext.Extension):
+    """
+    Jinja extension which minifies the source of every `.html` template with `minify_html` when it's loaded,
+    so that it's done once per template rather than for every response.
+    """
+    def preprocess(self, source: str, name: str | None, filename: str | None = None) -> str:
+        if name is not None and name.endswith(".html"):
+            return minify_html(source)
+        return source
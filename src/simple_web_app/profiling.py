@@ -0,0 +1,92 @@
+import collections
+import contextvars
+import dataclasses
+import functools
+import logging
+import time
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class QueryProfile:
+    name: str
+    parameters: dict[str, Any]
+    duration: float
+    rows: int | None
+    plan: list[str] | None = None
+
+
+@dataclasses.dataclass
+class RequestProfile:
+    """
+    The named queries run while handling one request, collected by the wrappers `profile_queries` installs.
+    """
+    queries: list[QueryProfile] = dataclasses.field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return sum(query.duration for query in self.queries)
+
+    def by_name(self) -> dict[str, list[QueryProfile]]:
+        queries = collections.defaultdict(list)
+        for query in self.queries:
+            queries[query.name].append(query)
+        return queries
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing header value with the total time spent in queries, and the time spent in each named query,
+        which browsers show alongside the request's own timings.
+        """
+        metrics = [f'db;dur={self.duration * 1000:.2f};desc="{len(self.queries)} queries"']
+        metrics += [f"{name};dur={sum(q.duration for q in queries) * 1000:.2f}" for name, queries in self.by_name().items()]
+        return ", ".join(metrics)
+
+    def summary(self) -> str:
+        return f"{len(self.queries)} queries in {self.duration * 1000:.2f}ms" + "".join(
+            f", {name} x{len(queries)} {sum(q.duration for q in queries) * 1000:.2f}ms" for name, queries in self.by_name().items()
+        )
+
+    def repeated_queries(self, threshold: int) -> dict[str, int]:
+        """
+        Named queries which ran more than `threshold` times, which usually means one query per row of another
+        query's results (an N+1 pattern) which should be a single batched query instead.
+        """
+        return {name: len(queries) for name, queries in self.by_name().items() if len(queries) > threshold}
+
+
+# Set by ProfilingMiddleware for the duration of each request.
+current_profile: contextvars.ContextVar[RequestProfile | None] = contextvars.ContextVar("current_profile", default=None)
+
+
+def profile_queries(queries, explain_threshold: float = 0.0):
+    """
+    Wrap every query function of an aiosql `Queries` object to record its parameters, duration and number of rows
+    in the profile of the current request, if there is one. The `_cursor` variants are left alone.
+
+    @param float explain_threshold: Also record the `EXPLAIN QUERY PLAN` of queries which take longer than this
+        many seconds, 0 to never do so.
+    """
+    def profile(name: str, fn):
+        @functools.wraps(fn)
+        async def profiled(conn, *args, **kwargs):
+            request_profile = current_profile.get()
+            if request_profile is None:
+                return await fn(conn, *args, **kwargs)
+            start = time.perf_counter()
+            result = await fn(conn, *args, **kwargs)
+            duration = time.perf_counter() - start
+            query = QueryProfile(name, kwargs, duration, len(result) if isinstance(result, list) else None)
+            if explain_threshold > 0 and duration > explain_threshold:
+                plan = await conn.execute(f"EXPLAIN QUERY PLAN {fn.sql}", kwargs)
+                query.plan = [row[3] for row in await plan.fetchall()]
+            request_profile.queries.append(query)
+            return result
+        return profiled
+
+    for name in queries.available_queries:
+        if not name.endswith("_cursor"):
+            setattr(queries, name, profile(name, getattr(queries, name)))
+    return queries
@@ -1,28 +1,39 @@
--- name: get_news(limit, offset, max_published_time)
-SELECT id, title, text, published
+-- name: get_news(limit, max_published_at, cursor_published_at, cursor_id)
+-- Keyset pagination: returns the rows ordered after (cursor_published_at, cursor_id).
+SELECT id, title, text, published_at
 FROM news_item
 WHERE language = 'english'
-  AND (published < :max_published_time)
-ORDER BY published DESC, id ASC
-LIMIT :limit
-OFFSET :offset;
+  AND (published_at < :max_published_at)
+  AND published_at <= :cursor_published_at
+  AND (published_at < :cursor_published_at OR id > :cursor_id)
+ORDER BY published_at DESC, id ASC
+LIMIT :limit;
 
--- name: search_news(query, limit)
-SELECT title, text
-FROM news_item_fts(:query)
+-- name: search_news(query, limit, match_start, match_end)
+-- Ranked by bm25 with matches in the title weighted ten times higher than in the text. Ordering by FTS5's rank
+-- column sorts inside the virtual table rather than in a temp b-tree. Returns the highlighted title and a short
+-- snippet of the text around the matches instead of the whole article.
+SELECT rowid AS id,
+       highlight(news_item_fts, 0, :match_start, :match_end) AS title,
+       snippet(news_item_fts, 1, :match_start, :match_end, '…', 32) AS snippet
+FROM news_item_fts
+WHERE news_item_fts MATCH :query
+  AND rank MATCH 'bm25(10.0, 1.0)'
+ORDER BY rank
 LIMIT :limit;
 
--- name: get_news_by_category(category_id, limit, offset, max_published_time)
-SELECT ni.id, ni.title, ni.text, ni.published
+-- name: get_news_by_category(category_id, limit, max_published_at, cursor_published_at, cursor_id)
+SELECT ni.id, ni.title, ni.text, ni.published_at
 FROM news_item AS ni
 INNER JOIN news_item_category AS nic
   ON nic.news_item_id = ni.id
 WHERE ni.language = 'english'
-  AND (ni.published < :max_published_time)
+  AND (ni.published_at < :max_published_at)
+  AND ni.published_at <= :cursor_published_at
+  AND (ni.published_at < :cursor_published_at OR ni.id > :cursor_id)
   AND nic.category_id = :category_id
-ORDER BY ni.published DESC, ni.id ASC
-LIMIT :limit
-OFFSET :offset;
+ORDER BY ni.published_at DESC, ni.id ASC
+LIMIT :limit;
 
 -- name: get_categories_for_news(news_item_id)
 SELECT c.id, c.name
@@ -31,6 +42,14 @@ INNER JOIN category AS c
   ON c.id = nic.category_id
 WHERE nic.news_item_id = :news_item_id;
 
+-- name: get_categories_for_news_batch(news_item_ids)
+-- news_item_ids is a JSON array of news item IDs.
+SELECT nic.news_item_id, c.id, c.name
+FROM news_item_category AS nic
+INNER JOIN category AS c
+  ON c.id = nic.category_id
+WHERE nic.news_item_id IN (SELECT value FROM json_each(:news_item_ids));
+
 -- name: get_categories(limit)
 SELECT id, name
 FROM category
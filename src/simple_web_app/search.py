@@ -0,0 +1,41 @@
+import re
+
+from markupsafe import Markup, escape
+
+# Control characters which never occur in news text, used by the FTS5 highlight() and snippet() functions to
+# delimit matches. The text is HTML-escaped before they are replaced with <mark> tags.
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+# Shorter prefixes match too much of the vocabulary to be useful while typing.
+MIN_PREFIX_LENGTH = 2
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def build_match_query(user_input: str) -> str:
+    """
+    Turn free text typed by a user into an FTS5 MATCH expression which finds rows containing all of its words.
+
+    Every word is quoted, so FTS5 operators and stray quotes in the input are matched literally instead of
+    causing a syntax error. Words are case-folded, which FTS5 does anyway, so that the result can be used as a
+    cache key. The last word is matched as a prefix while it is still being typed, i.e. unless the input ends
+    with whitespace. Returns an empty string if the input contains no words.
+
+        >>> build_match_query('Climate "chan')
+        '"climate" "chan"*'
+    """
+    tokens = _TOKEN_RE.findall(user_input.casefold())
+    if not tokens:
+        return ""
+    terms = [f'"{token}"' for token in tokens]
+    if not user_input[-1].isspace() and len(tokens[-1]) >= MIN_PREFIX_LENGTH:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def mark_matches(text: str) -> Markup:
+    """
+    HTML-escape text returned by highlight() or snippet() and wrap its matches in <mark> tags.
+    """
+    return escape(text).replace(MATCH_START, Markup("<mark>")).replace(MATCH_END, Markup("</mark>"))
@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import stat
+from pathlib import Path
+
+import brotli
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from simple_web_app.middleware import negotiate_encoding
+
+logger = logging.getLogger(__name__)
+
+# Sidecar file suffix for each content coding, in order of preference.
+SIDECAR_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".html", ".json", ".txt", ".xml"}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def precompress_directory(directory: Path, minimum_size: int = 500) -> int:
+    """
+    Write `.br` and `.gz` sidecar files next to every compressible file in `directory` which is at least
+    `minimum_size` bytes, so that they are compressed once instead of on every request.
+
+    Sidecars which are newer than their source file are left alone, as are files which don't get any smaller.
+    Returns the number of sidecar files written.
+    """
+    written = 0
+    for path in sorted(Path(directory).rglob("*")):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        source_stat = path.stat()
+        if source_stat.st_size < minimum_size:
+            continue
+        data = None
+        for encoding, suffix in SIDECAR_SUFFIXES.items():
+            sidecar = path.with_name(path.name + suffix)
+            if sidecar.exists() and sidecar.stat().st_mtime >= source_stat.st_mtime:
+                continue
+            data = data if data is not None else path.read_bytes()
+            compressed = _compress(data, encoding)
+            if len(compressed) >= len(data):
+                continue
+            sidecar.write_bytes(compressed)
+            written += 1
+    return written
+
+
+def precompress_static(directory: Path, minimum_size: int = 500) -> None:
+    try:
+        written = precompress_directory(directory, minimum_size)
+    except OSError as e:
+        # E.g. the package is installed on a read-only file system; sidecars should then be created at build time.
+        logger.warning(f"Could not precompress static files in {directory}: {e}")
+        return
+    logger.info(f"Precompressed {written} static files in {directory}.")
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles which serves a precompressed `.br` or `.gz` sidecar of the requested file when one exists and
+    the client accepts its encoding.
+    """
+    def file_response(self, full_path: os.PathLike, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        accept_encoding = request_headers.get("accept-encoding", "")
+        available = [e for e, suffix in SIDECAR_SUFFIXES.items() if _is_file(f"{full_path}{suffix}")]
+        encoding = negotiate_encoding(accept_encoding, available) if available else None
+        if encoding is None:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+            if available:
+                response.headers.add_vary_header("Accept-Encoding")
+            return response
+
+        sidecar_path = f"{full_path}{SIDECAR_SUFFIXES[encoding]}"
+        media_type, _ = mimetypes.guess_type(str(full_path))
+        response = FileResponse(
+            sidecar_path,
+            status_code=status_code,
+            stat_result=os.stat(sidecar_path),
+            media_type=media_type or "text/plain",
+            headers={"content-encoding": encoding, "vary": "Accept-Encoding"},
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class FingerprintedStaticFiles(PrecompressedStaticFiles):
+    """
+    PrecompressedStaticFiles which also serves every file under a name containing a hash of its content, e.g.
+    `style.css` as `style.3f2a9c1b0d4e.css`, with a year-long immutable Cache-Control header.
+
+    A fingerprinted URL changes whenever the file does, so browsers never need to revalidate it. Call
+    `fingerprint()` once at startup to hash the files, and `url_path()` to get the name to link to.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fingerprints: dict[str, str] = {}
+        self._originals: dict[str, str] = {}
+
+    def fingerprint(self) -> None:
+        directory = Path(self.directory)
+        fingerprints = {}
+        for path in sorted(directory.rglob("*")):
+            is_sidecar = any(path.name.endswith(suffix) for suffix in SIDECAR_SUFFIXES.values())
+            if not path.is_file() or is_sidecar:
+                continue
+            digest = hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+            relative_path = path.relative_to(directory)
+            fingerprinted = relative_path.with_name(f"{path.stem}.{digest}{path.suffix}")
+            fingerprints[relative_path.as_posix()] = fingerprinted.as_posix()
+        self.fingerprints = fingerprints
+        self._originals = {os.path.normpath(v): k for k, v in fingerprints.items()}
+        logger.info(f"Fingerprinted {len(fingerprints)} static files in {directory}.")
+
+    def url_path(self, path: str) -> str:
+        """
+        The fingerprinted name of a static file, or `path` itself if it hasn't been fingerprinted.
+        """
+        return self.fingerprints.get(path, path)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        original = self._originals.get(path)
+        if original is None:
+            return await super().get_response(path, scope)
+        response = await super().get_response(os.path.normpath(original), scope)
+        response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+def _is_file(path: str) -> bool:
+    try:
+        return stat.S_ISREG(os.stat(path).st_mode)
+    except OSError:
+        return False
@@ -0,0 +1,77 @@
+"""
+Compare the throughput of the JSON logging setups, in log lines per second as seen by the logging thread:
+
+    python tests/benchmark_logging.py [--lines 100000]
+
+- stdlib: JsonFormatter serializing with `json.dumps` through a synchronous `StreamHandler`, as before.
+- orjson: JsonFormatter serializing with orjson through a synchronous `BytesStreamHandler`.
+- queue: the same as orjson, handed to a `QueueListener` thread through a `QueueHandler`, as in logging.json.
+  Reported both for the calling thread alone and including the time to drain the queue.
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import time
+
+from simple_web_app.log import BytesStreamHandler, JsonFormatter, QueueHandler, QueueListener
+
+FMT_DICT = {
+    "level": "levelname",
+    "message": "message",
+    "loggerName": "name",
+    "processName": "processName",
+    "processID": "process",
+    "threadName": "threadName",
+    "threadID": "thread",
+    "timestamp": "asctime",
+}
+
+
+class StdlibJsonFormatter(JsonFormatter):
+    def format(self, record) -> str:
+        record.message = record.getMessage()
+        record.asctime = self.formatTime(record, self.datefmt)
+        return json.dumps(self.formatMessage(record), default=str)
+
+
+def _run(logger: logging.Logger, lines: int) -> float:
+    start = time.perf_counter()
+    for i in range(lines):
+        logger.info("Request %d handled in %.3fs", i, 0.001)
+    return time.perf_counter() - start
+
+
+def benchmark(lines: int) -> dict[str, float]:
+    logger = logging.getLogger("benchmark")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    results = {}
+    with open(os.devnull, "w") as text_stream, open(os.devnull, "wb") as bytes_stream:
+        stdlib_handler = logging.StreamHandler(text_stream)
+        stdlib_handler.setFormatter(StdlibJsonFormatter(FMT_DICT))
+        orjson_handler = BytesStreamHandler(bytes_stream)
+        orjson_handler.setFormatter(JsonFormatter(FMT_DICT))
+
+        for name, handler in [("stdlib", stdlib_handler), ("orjson", orjson_handler)]:
+            logger.handlers = [handler]
+            results[name] = lines / _run(logger, lines)
+
+        queue_handler = QueueHandler(queue.SimpleQueue())
+        queue_handler.listener = QueueListener(queue_handler.queue, orjson_handler)
+        logger.handlers = [queue_handler]
+        start = time.perf_counter()
+        elapsed = _run(logger, lines)
+        queue_handler.close()
+        results["queue (caller)"] = lines / elapsed
+        results["queue (drained)"] = lines / (time.perf_counter() - start)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=100_000)
+    args = parser.parse_args()
+    for name, lines_per_second in benchmark(args.lines).items():
+        print(f"{name:>16}: {lines_per_second:>10,.0f} lines/s")
@@ -1,7 +1,117 @@
-from locust import HttpUser, task
+"""
+Load test of the journeys readers take through the site, each sending the requests htmx sends for them.
 
-class QuickstartUser(HttpUser):
-    @task
-    def home_page(self):
-        self.client.get("/")
+Run it against a server with a large dataset loaded, e.g. headless for 5 minutes with 200 users, writing the
+p50/p95/p99 response times per endpoint to a JSON file to compare builds with:
 
+    locust -f tests/locustfile.py --host http://localhost:8000 --headless -u 200 -r 20 -t 5m --summary-json summary.json
+"""
+import html
+import json
+import random
+import re
+
+import gevent
+from locust import HttpUser, between, events, task
+
+# Terms searched for, from ones most articles contain to ones few do.
+SEARCH_TERMS = ["the", "government", "climate", "election", "market", "football", "vaccine", "earthquake", "semiconductor", "referendum"]
+SETTINGS_TABS = ["general", "categories", "sections", "syncing", "experimental"]
+# Pages a reader scrolls through on the feed, including the first one.
+MAX_PAGES = 10
+
+LOAD_MORE_URL = re.compile(r'id="load-more-btn"[^>]*?hx-get="([^"]+)"', re.DOTALL)
+CATEGORY_ID = re.compile(r"category_id=(\d+)")
+PERCENTILES = [0.5, 0.95, 0.99]
+
+
+def htmx_headers(preloaded: bool = False) -> dict[str, str]:
+    headers = {"HX-Request": "true"}
+    if preloaded:
+        # The preload extension requests links on mousedown, and the browser then serves the click from its cache.
+        headers["HX-Preloaded"] = "true"
+    return headers
+
+
+def load_more_url(page: str) -> str | None:
+    match = LOAD_MORE_URL.search(page)
+    if match is None or "disabled" in match.group(0):
+        return None
+    return html.unescape(match.group(1))
+
+
+class Reader(HttpUser):
+    wait_time = between(1, 5)
+
+    def on_start(self):
+        self.category_ids = []
+
+    def open_home_page(self) -> str:
+        page = self.client.get("/", name="/ (full page)").text
+        self.category_ids = sorted({int(c) for c in CATEGORY_ID.findall(page)}) or self.category_ids
+        return page
+
+    def scroll(self, page: str, name: str, pages: int) -> None:
+        for _ in range(pages):
+            url = load_more_url(page)
+            if url is None:
+                break
+            self.wait()
+            page = self.client.get(url, name=name, headers=htmx_headers(preloaded=True)).text
+
+    @task(5)
+    def scroll_feed(self):
+        page = self.open_home_page()
+        self.scroll(page, "/?cursor (load more)", random.randint(1, MAX_PAGES - 1))
+
+    @task(3)
+    def browse_category(self):
+        if not self.category_ids:
+            self.open_home_page()
+        if not self.category_ids:
+            return
+        category_id = random.choice(self.category_ids)
+        page = self.client.get(f"/?category_id={category_id}", name="/?category_id (filter)", headers=htmx_headers(preloaded=True)).text
+        self.scroll(page, "/?category_id&cursor (load more)", random.randint(0, 3))
+
+    @task(2)
+    def search(self):
+        self.client.get("/search", name="/search (open)", headers=htmx_headers(preloaded=True))
+        # The search box requests results on load, then whenever typing pauses for 500ms.
+        self.client.post("/search", name="/search (type)", data={"search": ""}, headers=htmx_headers())
+        term = random.choice(SEARCH_TERMS)
+        for i in range(1, len(term) + 1):
+            pause = random.uniform(0.1, 0.8)
+            if pause >= 0.5 or i == len(term):
+                self.client.post("/search", name="/search (type)", data={"search": term[:i]}, headers=htmx_headers())
+            gevent.sleep(pause)
+
+    @task(1)
+    def open_settings(self):
+        self.client.get("/settings", name="/settings (open)", headers=htmx_headers(preloaded=True))
+        for tab in random.sample(SETTINGS_TABS, random.randint(1, len(SETTINGS_TABS))):
+            self.wait()
+            self.client.get(f"/settings/tab?tab={tab}", name="/settings/tab", headers=htmx_headers(preloaded=True))
+
+
+@events.init_command_line_parser.add_listener
+def add_arguments(parser):
+    parser.add_argument("--summary-json", default="", help="Write p50/p95/p99 response times per endpoint to this file.")
+
+
+@events.quitting.add_listener
+def write_summary(environment, **kwargs):
+    path = environment.parsed_options.summary_json if environment.parsed_options else ""
+    if not path:
+        return
+    summary = {}
+    for entry in [*environment.stats.entries.values(), environment.stats.total]:
+        summary[f"{entry.method} {entry.name}" if entry.method else entry.name] = {
+            "requests": entry.num_requests,
+            "failures": entry.num_failures,
+            "rps": round(entry.total_rps, 2),
+            "avg_ms": round(entry.avg_response_time, 2),
+            **{f"p{int(p * 100)}_ms": entry.get_response_time_percentile(p) for p in PERCENTILES},
+        }
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2)
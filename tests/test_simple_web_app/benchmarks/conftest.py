@@ -0,0 +1,182 @@
+"""
+Micro-benchmarks of the handlers, named queries and templates against generated datasets.
+
+They're deselected by default, run them on their own with `pytest -m benchmark`. Settings are read from the
+environment:
+
+    BENCHMARK_SIZES      Comma separated dataset sizes, numbers or presets of simple-web-app-generate (default 10k)
+    BENCHMARK_SEED       Seed of the generated datasets (default 0)
+    BENCHMARK_ROUNDS     Timed rounds per benchmark, after BENCHMARK_WARMUP untimed ones (default 100 and 10)
+    BENCHMARK_JSON       File the results are written to (default .benchmarks/latest.json)
+    BENCHMARK_BASELINE   Results to compare against, if the file exists (default .benchmarks/baseline.json)
+    BENCHMARK_THRESHOLD  Fraction by which a median may exceed its baseline before it's a regression (default 0.2)
+
+Datasets are generated once and kept in the pytest cache. To save a run as the baseline, copy its results over
+the baseline file.
+"""
+import asyncio
+import dataclasses
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import time
+import unittest.mock
+import warnings
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+import pytest
+
+from simple_web_app.generate import PRESETS, run_generate_async
+
+BENCHMARK_ENV = {
+    "DEBUG": "false",
+    "DATABASE_PATH": ":memory:",
+    "RUN_MAINTENANCE": "false",
+}
+SIZES = [size.strip() for size in os.environ.get("BENCHMARK_SIZES", "10k").split(",") if size.strip()]
+SEED = int(os.environ.get("BENCHMARK_SEED", "0"))
+ROUNDS = int(os.environ.get("BENCHMARK_ROUNDS", "100"))
+WARMUP = int(os.environ.get("BENCHMARK_WARMUP", "10"))
+RESULTS_PATH = Path(os.environ.get("BENCHMARK_JSON", ".benchmarks/latest.json"))
+BASELINE_PATH = Path(os.environ.get("BENCHMARK_BASELINE", ".benchmarks/baseline.json"))
+THRESHOLD = float(os.environ.get("BENCHMARK_THRESHOLD", "0.2"))
+
+# Timings of each benchmark which ran, by test ID.
+results: dict[str, dict[str, float]] = {}
+regressions: dict[str, tuple[float, float]] = {}
+
+
+@dataclasses.dataclass
+class Dataset:
+    size: str
+    path: Path
+    # After the last publish time, so that every page shows the same rows whatever the time the benchmark runs.
+    current_time: int
+
+
+def _count(size: str) -> int:
+    if size.lower() in PRESETS:
+        return PRESETS[size.lower()]
+    return int(size)
+
+
+def pytest_generate_tests(metafunc):
+    if "dataset" in metafunc.fixturenames:
+        metafunc.parametrize("dataset", SIZES, indirect=True, scope="session")
+
+
+@pytest.fixture(scope="session")
+def dataset(request, tmp_path_factory, benchmark_app) -> Dataset:
+    size = request.param
+    # Regenerated whenever a migration is added, so that it always has the current schema.
+    latest_migration = max(path.name for path in benchmark_app.MIGRATION_DIR.iterdir()).split("_")[0]
+    # Kept between runs in the pytest cache, unless it's disabled.
+    directory = request.config.cache.mkdir("benchmark-datasets") if hasattr(request.config, "cache") else tmp_path_factory.mktemp("datasets")
+    path = directory / f"{size}-seed{SEED}-{latest_migration}.sqlite3"
+    if not path.exists():
+        partial_path = path.with_suffix(".partial")
+        partial_path.unlink(missing_ok=True)
+        asyncio.run(run_generate_async(partial_path, _count(size), SEED))
+        partial_path.rename(path)
+    with sqlite3.connect(path) as conn:
+        (max_published_at,) = conn.execute("SELECT max(published_at) FROM news_item").fetchone()
+    return Dataset(size, path, max_published_at + 1)
+
+
+@pytest.fixture()
+def test_env() -> dict[str, str]:
+    return BENCHMARK_ENV
+
+
+@pytest.fixture(scope="session", autouse=True)
+def benchmark_app():
+    """
+    Import the app with the benchmark settings, since it reads them on its first import.
+    """
+    with unittest.mock.patch.dict(os.environ, BENCHMARK_ENV, clear=True):
+        import simple_web_app.app
+    if simple_web_app.app.DEBUG:
+        warnings.warn("The app was imported in debug mode by other tests, run benchmarks on their own with -m benchmark")
+    return simple_web_app.app
+
+
+@pytest.fixture()
+async def benchmark_client(async_test_client, dataset, benchmark_app, monkeypatch):
+    """
+    A test client of the app serving `dataset`, which renders every request rather than serving it from a cache.
+    Enter it in the test, so that the app's lifespan runs in the test's task.
+    """
+    monkeypatch.setattr(benchmark_app, "DATABASE_PATH", dataset.path)
+    monkeypatch.setattr(benchmark_app, "APPLY_MIGRATIONS", False)
+    monkeypatch.setattr(benchmark_app, "FRAGMENT_CACHE_TTL", 0)
+    monkeypatch.setattr(benchmark_app.search_news.cache, "ttl", 0)
+    return async_test_client
+
+
+@pytest.fixture()
+def bench(request) -> Callable[[Callable[[], Awaitable]], Awaitable[dict[str, float]]]:
+    """
+    Time an async function over BENCHMARK_ROUNDS calls, after BENCHMARK_WARMUP untimed ones, and record the
+    timings in milliseconds under the test's ID.
+    """
+    async def run(fn: Callable[[], Awaitable]) -> dict[str, float]:
+        for _ in range(WARMUP):
+            await fn()
+        timings = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            await fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        result = {
+            "rounds": len(timings),
+            "min_ms": timings[0],
+            "median_ms": statistics.median(timings),
+            "mean_ms": statistics.fmean(timings),
+            "p95_ms": timings[min(round(len(timings) * 0.95), len(timings) - 1)],
+            "max_ms": timings[-1],
+        }
+        results[request.node.nodeid] = result
+        return result
+    return run
+
+
+def pytest_sessionfinish(session):
+    if not results:
+        return
+    RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "rounds": ROUNDS,
+            "benchmarks": results,
+        }, f, indent=2)
+    if not BASELINE_PATH.exists():
+        return
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)["benchmarks"]
+    for name, result in results.items():
+        if name in baseline and result["median_ms"] > baseline[name]["median_ms"] * (1 + THRESHOLD):
+            regressions[name] = (baseline[name]["median_ms"], result["median_ms"])
+    if regressions:
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not results:
+        return
+    terminalreporter.section("benchmarks")
+    width = max(len(name) for name in results)
+    terminalreporter.write_line(f"{'benchmark':<{width}} {'median ms':>10} {'p95 ms':>10} {'min ms':>10}")
+    for name, result in sorted(results.items()):
+        terminalreporter.write_line(f"{name:<{width}} {result['median_ms']:>10.3f} {result['p95_ms']:>10.3f} {result['min_ms']:>10.3f}")
+    terminalreporter.write_line(f"Results written to {RESULTS_PATH}")
+    for name, (before, after) in regressions.items():
+        terminalreporter.write_line(
+            f"REGRESSION {name}: median {before:.3f}ms -> {after:.3f}ms (+{(after / before - 1) * 100:.0f}%, threshold {THRESHOLD * 100:.0f}%)",
+            red=True,
+        )
@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+pytestmark = pytest.mark.benchmark
+
+# Categories of generated datasets with the most articles and with the fewest.
+COMMON_CATEGORY_ID, RARE_CATEGORY_ID = 1, 30
+PAGE_SIZE = 5
+# Terms most generated articles contain, terms few do, and a prefix as search-as-you-type sends it.
+SEARCH_TERMS = {"common": "the said", "rare": "referendum", "prefix": "elec"}
+
+
+def _page_cursor(dataset, category_id: int | None, page: int) -> str | None:
+    """
+    The cursor the load more button of page `page - 1` links to, or None for the first page.
+    """
+    from simple_web_app.app import encode_cursor
+
+    if page == 1:
+        return None
+    join = "INNER JOIN news_item_category AS nic ON nic.news_item_id = ni.id AND nic.category_id = :category_id" if category_id else ""
+    with sqlite3.connect(dataset.path) as conn:
+        row = conn.execute(
+            f"""
+            SELECT ni.published_at, ni.id FROM news_item AS ni {join}
+            WHERE ni.language = 'english' AND ni.published_at < :current_time
+            ORDER BY ni.published_at DESC, ni.id ASC
+            LIMIT 1 OFFSET :offset
+            """,
+            {"category_id": category_id, "current_time": dataset.current_time, "offset": (page - 1) * PAGE_SIZE - 1},
+        ).fetchone()
+    if row is None:
+        pytest.skip(f"The {dataset.size} dataset has fewer than {page} pages")
+    return encode_cursor(*row)
+
+
+@pytest.mark.parametrize("htmx", [False, True], ids=["full", "htmx"])
+@pytest.mark.parametrize("category_id", [None, COMMON_CATEGORY_ID, RARE_CATEGORY_ID], ids=["all", "common_category", "rare_category"])
+@pytest.mark.parametrize("page", [1, 10, 100])
+async def test_show_home_page(benchmark_client, bench, dataset, page, category_id, htmx):
+    params = {"current_time": dataset.current_time}
+    if category_id:
+        params["category_id"] = category_id
+    cursor = _page_cursor(dataset, category_id, page)
+    if cursor:
+        params["cursor"] = cursor
+    headers = {"HX-Request": "true"} if htmx else {}
+
+    async with benchmark_client as client:
+        async def show_home_page():
+            response = await client.get("/", params=params, headers=headers)
+            assert response.status_code == 200
+
+        await bench(show_home_page)
+
+
+@pytest.mark.parametrize("term", SEARCH_TERMS.values(), ids=SEARCH_TERMS.keys())
+async def test_search(benchmark_client, bench, dataset, term):
+    async with benchmark_client as client:
+        async def search():
+            response = await client.post("/search", data={"search": term}, headers={"HX-Request": "true"})
+            assert response.status_code == 200
+
+        await bench(search)
@@ -0,0 +1,55 @@
+import aiosql
+import orjson
+import pytest
+
+from simple_web_app.db import Database
+from simple_web_app.search import MATCH_END, MATCH_START, build_match_query
+
+pytestmark = pytest.mark.benchmark
+
+
+def _first_page(dataset) -> dict:
+    from simple_web_app.app import MAX_NEWS_ITEM_ID
+
+    return {"limit": 6, "max_published_at": dataset.current_time, "cursor_published_at": dataset.current_time, "cursor_id": MAX_NEWS_ITEM_ID}
+
+
+def _parameters(dataset, news_item_ids: list[int]) -> dict[str, dict]:
+    """
+    Parameters of each named query, as the handlers pass them for the first page of the feed.
+    """
+    return {
+        "get_news": _first_page(dataset),
+        "get_news_by_category": _first_page(dataset) | {"category_id": 1},
+        "search_news": {"query": build_match_query("climate"), "limit": 10, "match_start": MATCH_START, "match_end": MATCH_END},
+        "get_categories_for_news": {"news_item_id": news_item_ids[0]},
+        "get_categories_for_news_batch": {"news_item_ids": orjson.dumps(news_item_ids).decode()},
+        "get_categories": {"limit": 20},
+    }
+
+
+def _queries():
+    from simple_web_app.app import QUERY_DIR
+
+    # Loaded afresh, so that the queries run without the caches and instrumentation of the app's.
+    return aiosql.from_path(QUERY_DIR / "basic.sql", "aiosqlite")
+
+
+def test_every_query_is_benchmarked(dataset):
+    queries = _queries()
+    names = {name for name in queries.available_queries if not name.endswith("_cursor")}
+    assert names == set(_parameters(dataset, [1]))
+
+
+@pytest.mark.parametrize("name", ["get_news", "get_news_by_category", "search_news", "get_categories_for_news", "get_categories_for_news_batch", "get_categories"])
+async def test_query(bench, dataset, benchmark_app, name):
+    queries = _queries()
+    async with Database(dataset.path, readers=1, pragmas=benchmark_app.SQLITE_PRAGMAS) as db, db.reader() as conn:
+        rows = await queries.get_news(conn, **_first_page(dataset))
+        parameters = _parameters(dataset, [row["id"] for row in rows[:5]])[name]
+        query = getattr(queries, name)
+
+        async def run_query():
+            await query(conn, **parameters)
+
+        await bench(run_query)
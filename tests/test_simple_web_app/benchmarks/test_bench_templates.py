@@ -0,0 +1,20 @@
+import pytest
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.mark.parametrize("htmx", [False, True], ids=["index.html", "oob_swap.html"])
+async def test_render(benchmark_client, bench, dataset, htmx):
+    """
+    Render the first page of the feed with the context its handler built, as a full page, which is index.html in
+    the application layout, and as the out of band swap htmx requests.
+    """
+    async with benchmark_client as client:
+        response = await client.get("/", params={"current_time": dataset.current_time}, headers={"HX-Request": "true"} if htmx else {})
+        template, context = response.template, response.context
+        assert context.get("content", template.name) == ("oob_swap.html" if htmx else "index.html")
+
+        async def render():
+            template.render(context)
+
+        await bench(render)
@@ -19,6 +19,7 @@ import httpx
 import math
 import io
 import contextlib
+from types import GeneratorType
 from urllib.parse import unquote, urljoin
 from anyio.streams.stapled import StapledObjectStream
 from starlette.types import ASGIApp, Message, Receive, Scope, Send
@@ -1,4 +1,6 @@
+import logging
 import os
+import time
 import unittest
 import datetime
 import collections
@@ -67,9 +69,9 @@ def test_data(test_news_item, test_category, test_news_item_category) -> tuple[D
 async def test_home_page(async_test_client, test_data):
     """Full home page render."""
     async with async_test_client as client:
-        conn = client.app_state["conn"]
-        for d in test_data:
-            await insert_dummy_data(conn, d)
+        async with client.app_state["db"].writer() as conn:
+            for d in test_data:
+                await insert_dummy_data(conn, d)
         response = await client.get("/")
 
     assert response.status_code == 200
@@ -80,21 +82,42 @@ async def test_home_page(async_test_client, test_data):
 async def test_home_htmx(async_test_client, test_data):
     """Partial home template render for HTMX."""
     async with async_test_client as client:
-        conn = client.app_state["conn"]
-        for d in test_data:
-            await insert_dummy_data(conn, d)
+        async with client.app_state["db"].writer() as conn:
+            for d in test_data:
+                await insert_dummy_data(conn, d)
         response = await client.get("/", headers={"HX-Request": "true"})
 
     assert response.status_code == 200
     assert response.template.name == "oob_swap.html"
 
 
+async def test_batch_category_lookup(async_test_client, test_data, monkeypatch):
+    """The batched and per-row category lookups return the same categories."""
+    import simple_web_app.app
+
+    monkeypatch.setattr(simple_web_app.app, "FRAGMENT_CACHE_TTL", 0)
+    async with async_test_client as client:
+        async with client.app_state["db"].writer() as conn:
+            for d in test_data:
+                await insert_dummy_data(conn, d)
+
+        monkeypatch.setattr(simple_web_app.app, "BATCH_CATEGORY_LOOKUP", True)
+        batched = await client.get("/", headers={"HX-Request": "true"})
+        monkeypatch.setattr(simple_web_app.app, "BATCH_CATEGORY_LOOKUP", False)
+        per_row = await client.get("/", headers={"HX-Request": "true"})
+
+    batched_categories = [n["categories"] for n in batched.context["news"]]
+    per_row_categories = [[dict(c) for c in n["categories"]] for n in per_row.context["news"]]
+    assert batched_categories == per_row_categories
+    assert all(c == [{"id": 1, "name": "Category 1"}] for c in batched_categories)
+
+
 async def test_select_chain(async_test_client, test_data):
     """"""
     async with async_test_client as client:
-        conn = client.app_state["conn"]
-        for d in test_data:
-            await insert_dummy_data(conn, d)
+        async with client.app_state["db"].writer() as conn:
+            for d in test_data:
+                await insert_dummy_data(conn, d)
 
         # Open the home page
         response = await client.get("/")
@@ -103,7 +126,7 @@ async def test_select_chain(async_test_client, test_data):
         assert len(response.context["news"]) > 0
         soup = BeautifulSoup(response.text, features="html.parser")
         load_more_button = soup.find("button", {"id": "load-more-btn"})
-        assert "page=1" in load_more_button.attrs["hx-get"]
+        assert "cursor=" in load_more_button.attrs["hx-get"]
         assert "category_id" not in load_more_button.attrs["hx-get"]
 
         # Load more data
@@ -120,7 +143,7 @@ async def test_select_chain(async_test_client, test_data):
         assert response.context["category_id"] == 2
         soup = BeautifulSoup(response.text, features="html.parser")
         load_more_button = soup.find("button", {"id": "load-more-btn"})
-        assert "page=1" in load_more_button.attrs["hx-get"]
+        assert "cursor=" not in load_more_button.attrs["hx-get"]
         assert "category_id=2" in load_more_button.attrs["hx-get"]
 
         # Filter for category 1, show only news with that category
@@ -132,8 +155,9 @@ async def test_select_chain(async_test_client, test_data):
         soup = BeautifulSoup(response.text, features="html.parser")
         load_more_button = soup.find("button", {"id": "load-more-btn"})
         assert "disabled" not in load_more_button.attrs
-        assert "page=1" in load_more_button.attrs["hx-get"]
+        assert "cursor=" in load_more_button.attrs["hx-get"]
         assert "category_id=1" in load_more_button.attrs["hx-get"]
+        first_page_ids = {n["id"] for n in response.context["news"]}
 
         # Load more news, should all still be category one; we only have 1 left so the load more button should be disabled
         path = load_more_button["hx-get"]
@@ -145,10 +169,125 @@ async def test_select_chain(async_test_client, test_data):
         soup = BeautifulSoup(response.text, features="html.parser")
         load_more_button = soup.find("button", {"id": "load-more-btn"})
         assert "disabled" in load_more_button.attrs
-        assert "page=2" in load_more_button.attrs["hx-get"]
+        assert first_page_ids.isdisjoint(n["id"] for n in response.context["news"])  # No row is shown twice
+        assert "cursor=" in load_more_button.attrs["hx-get"]
         assert "category_id=1" in load_more_button.attrs["hx-get"]
 
 
+async def test_fragment_cache(async_test_client, test_data):
+    """Repeated requests for the same page are served from the fragment cache."""
+    async with async_test_client as client:
+        async with client.app_state["db"].writer() as conn:
+            for d in test_data:
+                await insert_dummy_data(conn, d)
+        first = await client.get("/", headers={"HX-Request": "true"})
+        second = await client.get("/", headers={"HX-Request": "true"})
+        full_page = await client.get("/")
+
+    assert first.headers["x-cache"] == "miss"
+    assert second.headers["x-cache"] == "hit"
+    assert second.text == first.text
+    assert full_page.headers["x-cache"] == "miss"
+
+
+@pytest.mark.parametrize("news_item_id", [None, 2**63, -1, True])
+async def test_invalid_cursor(async_test_client, news_item_id):
+    from simple_web_app.app import encode_cursor
+
+    cursor = encode_cursor(1754080955, news_item_id) if news_item_id is not None else "not-a-cursor"
+    async with async_test_client as client:
+        response = await client.get(f"/?cursor={cursor}", headers={"HX-Request": "true"})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("current_time", ["2025-08-01T20:42:35+00:00", str(2**63)])
+async def test_invalid_current_time(async_test_client, current_time):
+    async with async_test_client as client:
+        response = await client.get("/", params={"current_time": current_time}, headers={"HX-Request": "true"})
+    assert response.status_code == 400
+
+
+async def test_published_at(async_test_client, test_data):
+    """published_at is filled in from published, and the feed shows the time since it."""
+    import simple_web_app.app
+
+    async with async_test_client as client:
+        async with client.app_state["db"].writer() as conn:
+            for d in test_data:
+                await insert_dummy_data(conn, d)
+            await conn.execute("UPDATE news_item SET published = '2025-08-02T00:00:00+00:00' WHERE id = 1")
+            result = await conn.execute("SELECT id, published_at FROM news_item WHERE id IN (1, 2) ORDER BY id")
+            assert [tuple(row) for row in await result.fetchall()] == [(1, 1754092800), (2, 1754080955)]
+
+        response = await client.get("/", params={"current_time": 1754092800})
+    assert response.status_code == 200
+    # News item 1 was published at current_time, so it isn't shown.
+    assert [n["id"] for n in response.context["news"]] == [2, 3, 4, 5, 6]
+    expected = simple_web_app.app.format_duration(int(time.time()) - 1754080955, "{days} days, {hours} hours ago")
+    assert response.context["news"][0]["time_since_published"] == expected
+
+
+async def test_cached_page_does_not_depend_on_host(async_test_client, test_data):
+    """Cached pages are shared between requests, so they only contain root-relative URLs."""
+    async with async_test_client as client:
+        async with client.app_state["db"].writer() as conn:
+            for d in test_data:
+                await insert_dummy_data(conn, d)
+        params = {"current_time": 1754092800}
+        await client.get("/", params=params, headers={"Host": "evil.example"})
+        response = await client.get("/", params=params)
+
+    assert response.headers["x-cache"] == "hit"
+    assert "evil.example" not in response.text
+    soup = BeautifulSoup(response.text, features="html.parser")
+    assert soup.find("link", {"rel": "stylesheet"})["href"].startswith("/static/")
+    assert soup.find("button", {"id": "load-more-btn"})["hx-get"].startswith("/?")
+
+
+async def test_stream_full_page(async_test_client, test_data, monkeypatch):
+    """A streamed page is the same as a rendered one, and its head is sent before its queries run."""
+    import simple_web_app.app
+
+    monkeypatch.setattr(simple_web_app.app, "FRAGMENT_CACHE_TTL", 0)
+    async with async_test_client as client:
+        async with client.app_state["db"].writer() as conn:
+            for d in test_data:
+                await insert_dummy_data(conn, d)
+        expected = (await client.get("/", params={"current_time": 1754092800})).text
+
+        monkeypatch.setattr(simple_web_app.app, "STREAM_FULL_PAGES", True)
+        monkeypatch.setattr(simple_web_app.app, "STREAM_CHUNK_SIZE", 1000)
+        response = await client.get("/", params={"current_time": 1754092800})
+        assert response.text == expected
+
+        # Call the app directly, to see each chunk as it's sent.
+        messages = []
+        get_home_page_context = simple_web_app.app.get_home_page_context
+
+        async def get_context_after_head(*args):
+            assert b"</head>" in b"".join(m.get("body", b"") for m in messages)
+            return await get_home_page_context(*args)
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        monkeypatch.setattr(simple_web_app.app, "get_home_page_context", get_context_after_head)
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/", "raw_path": b"/", "root_path": "", "query_string": b"current_time=1754092800",
+            "headers": [(b"host", b"testserver")], "server": ("testserver", 80), "client": ("testclient", 50000),
+            "state": dict(client.app_state),
+        }
+        await simple_web_app.app.app(scope, receive, send)
+
+    bodies = [m["body"] for m in messages if m["type"] == "http.response.body" and m["body"]]
+    assert len(bodies) > 2
+    assert b"".join(bodies).decode() == expected
+
+
 async def test_settings(async_test_client, test_data):
     async with async_test_client as client:
         # Open the home page
@@ -175,6 +314,19 @@ async def test_settings(async_test_client, test_data):
         assert soup.find("h4").text == "Sync Preferences"
 
 
+async def test_startup(async_test_client, caplog):
+    import simple_web_app.app
+
+    with caplog.at_level(logging.INFO, logger="simple_web_app.app"):
+        async with async_test_client:
+            pass
+    assert "Started in " in caplog.text
+    assert {"import", "compile_templates", "open_database", "migrate"} <= set(simple_web_app.app.startup_timings)
+    # Every template was compiled before the first request.
+    env = simple_web_app.app.templates.env
+    assert len(env.cache) == len(env.list_templates())
+
+
 async def test_preload():
     pass
 
@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+from starlette.responses import Response
+
+from simple_web_app.cache import FragmentCache, QueryCache, cached_query
+from simple_web_app.db import Database
+
+
+async def _count_rows(conn, *, table):
+    result = await conn.execute(f"SELECT COUNT(*) FROM {table}")
+    (count,) = await result.fetchone()
+    return count
+
+
+async def test_cached_query_hits_and_invalidation():
+    count_rows = cached_query(maxsize=8, ttl=60)(_count_rows)
+    async with Database(":memory:", readers=1, pragmas=[]) as db:
+        async with db.writer() as conn:
+            await conn.execute("CREATE TABLE t (x INTEGER)")
+
+        async with db.reader() as conn:
+            assert await count_rows(conn, table="t") == 0
+            assert await count_rows(conn, table="t") == 0
+        assert count_rows.cache.hits == 1
+        assert count_rows.cache.misses == 1
+
+        async with db.writer() as conn:
+            await conn.execute("INSERT INTO t (x) VALUES (1)")
+
+        async with db.reader() as conn:
+            assert await count_rows(conn, table="t") == 1
+        assert count_rows.cache.invalidations == 1
+        assert count_rows.cache.misses == 2
+
+
+def test_query_cache_ttl(monkeypatch):
+    cache = QueryCache(maxsize=8, ttl=10)
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("key") != "value"
+    assert len(cache) == 0
+
+
+def test_query_cache_lru():
+    cache = QueryCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+    assert "b" not in cache._entries
+
+
+def _renderer(body: bytes = b"page", delay: float = 0):
+    calls = []
+
+    async def render():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return Response(content=body)
+
+    return render, calls
+
+
+async def test_fragment_cache_hit():
+    cache = FragmentCache(maxsize=8, ttl=60, stale_ttl=60)
+    render, calls = _renderer()
+    first = await cache.get_or_render("key", render)
+    second = await cache.get_or_render("key", render)
+    assert first.headers["x-cache"] == "miss"
+    assert second.headers["x-cache"] == "hit"
+    assert second.body == b"page"
+    assert len(calls) == 1
+
+
+async def test_fragment_cache_single_flight():
+    cache = FragmentCache(maxsize=8, ttl=60, stale_ttl=60)
+    render, calls = _renderer(delay=0.01)
+    responses = await asyncio.gather(*[cache.get_or_render("key", render) for _ in range(10)])
+    assert all(r.body == b"page" for r in responses)
+    assert len(calls) == 1
+
+
+async def test_fragment_cache_stale_while_revalidate(monkeypatch):
+    cache = FragmentCache(maxsize=8, ttl=10, stale_ttl=60)
+    render, calls = _renderer()
+    await cache.get_or_render("key", render)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    responses = await asyncio.gather(*[cache.get_or_render("key", render) for _ in range(10)])
+    assert all(r.headers["x-cache"] == "stale" for r in responses)
+    await asyncio.gather(*cache._refresh_tasks)
+    assert len(calls) == 2
+    assert (await cache.get_or_render("key", render)).headers["x-cache"] == "hit"
+
+
+async def test_fragment_cache_close_cancels_refreshes(monkeypatch):
+    cache = FragmentCache(maxsize=8, ttl=10, stale_ttl=60)
+    await cache.get_or_render("key", _renderer()[0])
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    await cache.get_or_render("key", _renderer(delay=60)[0])
+    (task,) = cache._refresh_tasks
+    await cache.close()
+    assert task.cancelled()
+    assert not cache._refresh_tasks
+    assert not cache._inflight
+
+
+async def test_fragment_cache_does_not_store_errors():
+    cache = FragmentCache(maxsize=8, ttl=60, stale_ttl=60)
+
+    async def render():
+        return Response(content=b"error", status_code=500)
+
+    await cache.get_or_render("key", render)
+    assert len(cache) == 0
+
+
+async def test_cached_query_coalesces_concurrent_calls():
+    calls = []
+
+    async def slow_query(conn, *, value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return [value]
+
+    query = cached_query(maxsize=8, ttl=60)(slow_query)
+    async with Database(":memory:", readers=3, pragmas=[]) as db:
+        async def lookup():
+            async with db.reader() as conn:
+                return await query(conn, value=1)
+
+        results = await asyncio.gather(lookup(), lookup(), lookup())
+    assert results == [[1], [1], [1]]
+    assert calls == [1]
+    assert query.cache.misses == 1
+    assert query.cache.coalesced == 2
+    assert query.cache.hit_ratio == 2 / 3
+
+
+async def test_cache_stats(async_test_client):
+    from simple_web_app.app import get_cache_stats
+
+    async with async_test_client as client:
+        # The first lookup through each reader connection clears the cache, so go through all of them.
+        for search in ["climate", "Climate"] * client.app_state["db"].num_readers:
+            await client.post("/search", data={"search": search}, headers={"HX-Request": "true"})
+        stats = await get_cache_stats(client.app_state["fragment_cache"])
+    assert stats["search_news"]["hit_ratio"] > 0
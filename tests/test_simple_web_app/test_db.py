@@ -0,0 +1,69 @@
+import asyncio
+import importlib.resources
+import sqlite3
+
+import pytest
+
+from simple_web_app.__main__ import prepare_database
+from simple_web_app.db import Database
+
+MIGRATION_DIR = importlib.resources.files("simple_web_app").joinpath("migrations")
+
+
+async def test_readers_see_writes():
+    async with Database(":memory:", readers=2, pragmas=[]) as db:
+        async with db.writer() as conn:
+            await conn.execute("CREATE TABLE t (x INTEGER)")
+            await conn.execute("INSERT INTO t (x) VALUES (1)")
+        async with db.reader() as conn:
+            result = await conn.execute("SELECT x FROM t")
+            assert [tuple(row) for row in await result.fetchall()] == [(1,)]
+
+
+async def test_readers_are_read_only():
+    async with Database(":memory:", readers=1, pragmas=[]) as db:
+        async with db.writer() as conn:
+            await conn.execute("CREATE TABLE t (x INTEGER)")
+        async with db.reader() as conn:
+            with pytest.raises(sqlite3.OperationalError):
+                await conn.execute("INSERT INTO t (x) VALUES (1)")
+
+
+async def test_pool_wait_stats():
+    async with Database(":memory:", readers=1, pragmas=[]) as db:
+        async def hold():
+            async with db.reader():
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(hold(), hold())
+        assert db.stats.checkouts == 2
+        assert db.stats.waits == 1
+        assert db.stats.max_wait_seconds > 0
+        assert db.stats.in_use == 0
+
+
+async def test_prepare_database_is_idempotent(tmp_path):
+    database_path = tmp_path / "db.sqlite3"
+    await prepare_database(database_path, ["PRAGMA journal_mode = WAL;"], MIGRATION_DIR)
+    await prepare_database(database_path, ["PRAGMA journal_mode = WAL;"], MIGRATION_DIR)
+    async with Database(database_path, readers=1, pragmas=[]) as db, db.reader() as conn:
+        result = await conn.execute("SELECT version FROM migration_version")
+        (applied,) = await result.fetchone()
+    assert applied == len(list(MIGRATION_DIR.glob("*.sql")))
+
+
+async def test_open_file_database_with_wal(tmp_path):
+    # journal_mode returns a row, whose statement must not stay active while the readers connect.
+    pragmas = ["PRAGMA foreign_keys = ON;", "PRAGMA journal_mode = WAL;"]
+    async with Database(tmp_path / "db.sqlite3", readers=2, pragmas=pragmas) as db:
+        async with db.reader() as conn:
+            result = await conn.execute("PRAGMA journal_mode;")
+            assert (await result.fetchone())[0] == "wal"
+
+
+async def test_open_failure_closes_connections(tmp_path):
+    db = Database(tmp_path / "db.sqlite3", readers=2, pragmas=["PRAGMA journal_mode = WAL;", "NOT SQL;"])
+    with pytest.raises(sqlite3.OperationalError):
+        await db.open()
+    assert db._writer is None
+    assert db._all_readers == []
@@ -0,0 +1,27 @@
+import aiosqlite
+
+from simple_web_app.generate import generate_news_item_categories, generate_news_items, run_generate_async
+
+
+def test_generate_is_deterministic():
+    assert list(generate_news_items(50, seed=1)) == list(generate_news_items(50, seed=1))
+    assert list(generate_news_items(50, seed=1)) != list(generate_news_items(50, seed=2))
+    assert list(generate_news_item_categories(50, seed=1)) == list(generate_news_item_categories(50, seed=1))
+
+
+async def test_run_generate(tmp_path):
+    database_path = tmp_path / "db.sqlite3"
+    counts = await run_generate_async(database_path, 500, seed=1, batch_size=200)
+    assert counts["news_item"] == 500
+    # Generating more appends after the existing rows.
+    await run_generate_async(database_path, 100, seed=2)
+
+    async with aiosqlite.connect(database_path) as conn:
+        result = await conn.execute("SELECT count(*), min(id), max(id), count(DISTINCT language) FROM news_item")
+        assert await result.fetchone() == (600, 1, 600, 4)
+        result = await conn.execute("SELECT count(*) FROM news_item WHERE published_at = unixepoch(published)")
+        assert await result.fetchone() == (600,)
+        result = await conn.execute("SELECT count(*) FROM news_item_fts('the')")
+        assert (await result.fetchone())[0] > 500
+        result = await conn.execute("SELECT category_id FROM news_item_category GROUP BY category_id ORDER BY count(*) DESC LIMIT 1")
+        assert await result.fetchone() == (1,)
@@ -0,0 +1,111 @@
+import os
+import socket
+import subprocess
+import sys
+
+import aiosqlite
+import orjson
+
+from simple_web_app.ingest import ingest, run_ingest_async, suspended_fts_triggers
+from simple_web_app.maintenance import integrity_check, run_maintenance_async
+
+
+async def _fetch(conn: aiosqlite.Connection, sql: str) -> list[tuple]:
+    result = await conn.execute(sql)
+    return [tuple(row) for row in await result.fetchall()]
+
+
+def _write_files(tmp_path):
+    categories = tmp_path / "categories.csv"
+    categories.write_text("id,name\n1,Politics\n2,Science\n")
+    news = tmp_path / "news.jsonl"
+    news.write_bytes(b"\n".join(orjson.dumps({
+        "id": i,
+        "title": f"Title {i}",
+        "text": "Climate news" if i % 2 else "Other news",
+        "published": "2025-08-01T20:42:35+00:00",
+        "language": "english",
+        "source": "ignored",
+    }) for i in range(1, 8)))
+    news_categories = tmp_path / "news_categories.csv"
+    news_categories.write_text("news_item_id,category_id\n1,1\n2,2\n3,1\n")
+    return {"category": [categories], "news_item": [news], "news_item_category": [news_categories]}
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+async def test_ingest(tmp_path):
+    files = _write_files(tmp_path)
+    database_path = tmp_path / "db.sqlite3"
+    counts = await run_ingest_async(database_path, {"category": files["category"], "news_item": files["news_item"]}, batch_size=3)
+    assert counts == {"category": 2, "news_item": 7}
+
+    async with aiosqlite.connect(database_path) as conn:
+        assert await _fetch(conn, "SELECT id, name FROM category") == [(1, "Politics"), (2, "Science")]
+        assert await _fetch(conn, "SELECT COUNT(*) FROM news_item") == [(7,)]
+        assert await _fetch(conn, "SELECT rowid FROM news_item_fts('climate') ORDER BY rowid") == [(1,), (3,), (5,), (7,)]
+
+
+async def test_ingest_suspends_fts_triggers(tmp_path):
+    files = _write_files(tmp_path)
+    database_path = tmp_path / "db.sqlite3"
+    await run_ingest_async(database_path, {})
+
+    async with aiosqlite.connect(database_path, autocommit=True) as conn:
+        triggers = await _fetch(conn, "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name")
+        counts = await ingest(conn, files, suspend_fts_triggers=True, ignore_existing=True)
+        assert counts == {"category": 2, "news_item": 7, "news_item_category": 3}
+        assert await _fetch(conn, "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name") == triggers
+        assert await _fetch(conn, "SELECT rowid FROM news_item_fts('climate') ORDER BY rowid") == [(1,), (3,), (5,), (7,)]
+
+        # Loading the same files again skips the existing rows.
+        counts = await ingest(conn, files, ignore_existing=True)
+        assert await _fetch(conn, "SELECT COUNT(*) FROM news_item") == [(7,)]
+
+
+async def test_killed_load_restores_fts_triggers(tmp_path):
+    files = _write_files(tmp_path)
+    database_path = tmp_path / "db.sqlite3"
+    await run_ingest_async(database_path, {})
+
+    async with aiosqlite.connect(database_path, autocommit=True) as conn:
+        triggers = await _fetch(conn, "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name")
+        # Enter the block but never leave it, as if the process was killed during the load.
+        await suspended_fts_triggers(conn).__aenter__()
+        await ingest(conn, {"news_item": files["news_item"]})
+        assert not await integrity_check(conn)
+        assert await _fetch(conn, "SELECT DISTINCT owner_host, owner_pid FROM suspended_trigger") == [(socket.gethostname(), os.getpid())]
+        await conn.execute("UPDATE suspended_trigger SET owner_pid = ?", [_dead_pid()])
+
+    await run_ingest_async(database_path, {})
+    async with aiosqlite.connect(database_path, autocommit=True) as conn:
+        assert await _fetch(conn, "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name") == triggers
+        assert await _fetch(conn, "SELECT COUNT(*) FROM suspended_trigger") == [(0,)]
+        assert await _fetch(conn, "SELECT rowid FROM news_item_fts('climate') ORDER BY rowid") == [(1,), (3,), (5,), (7,)]
+        assert await integrity_check(conn)
+
+
+async def test_running_load_keeps_fts_triggers_suspended(tmp_path):
+    """Triggers of a load which is still running are only restored by the load itself or the maintenance command."""
+    files = _write_files(tmp_path)
+    database_path = tmp_path / "db.sqlite3"
+    await run_ingest_async(database_path, {})
+
+    async with aiosqlite.connect(database_path, autocommit=True) as conn:
+        triggers = await _fetch(conn, "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name")
+        await suspended_fts_triggers(conn).__aenter__()
+        await ingest(conn, {"news_item": files["news_item"]})
+
+    # Another load starting, e.g. the app, while this process is still "loading".
+    await run_ingest_async(database_path, {})
+    async with aiosqlite.connect(database_path, autocommit=True) as conn:
+        assert await _fetch(conn, "SELECT COUNT(*) FROM suspended_trigger") == [(3,)]
+
+    assert await run_maintenance_async(str(database_path), "restore-triggers")
+    async with aiosqlite.connect(database_path, autocommit=True) as conn:
+        assert await _fetch(conn, "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name") == triggers
+        assert await integrity_check(conn)
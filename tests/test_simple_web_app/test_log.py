@@ -0,0 +1,36 @@
+import io
+import logging
+import queue
+
+import orjson
+
+from simple_web_app.log import BytesStreamHandler, JsonFormatter, QueueHandler, QueueListener
+
+
+def _logger(handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger("test_log")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.handlers = [handler]
+    return logger
+
+
+def test_queue_logging_writes_json_lines():
+    stream = io.BytesIO()
+    handler = BytesStreamHandler(stream)
+    handler.setFormatter(JsonFormatter({"level": "levelname", "message": "message", "loggerName": "name"}))
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    queue_handler.listener = QueueListener(queue_handler.queue, handler)
+    logger = _logger(queue_handler)
+
+    logger.info("Hello %s", "world")
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logger.exception("Failed")
+    queue_handler.close()
+
+    first, second = [orjson.loads(line) for line in stream.getvalue().splitlines()]
+    assert first == {"level": "INFO", "message": "Hello world", "loggerName": "test_log"}
+    assert second["message"] == "Failed"
+    assert "ZeroDivisionError" in second["exc_info"]
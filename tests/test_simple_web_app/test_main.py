@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+import pytest
+import uvicorn
+
+import simple_web_app.__main__
+from simple_web_app.__main__ import Supervisor, run_worker, uvicorn_config_from_env
+
+
+class FakeProcess:
+    def __init__(self, pid: int, events: list[str]):
+        self.pid = pid
+        self.exitcode = None
+        self.events = events
+
+    def is_alive(self) -> bool:
+        return self.exitcode is None
+
+    def terminate(self) -> None:
+        self.events.append(f"stop {self.pid}")
+        self.exitcode = -15
+
+    def join(self, timeout=None) -> None:
+        pass
+
+    def kill(self) -> None:
+        self.exitcode = -9
+
+
+class FakeSupervisor(Supervisor):
+    def __init__(self, num_workers: int, **kwargs):
+        super().__init__(uvicorn.Config("simple_web_app.app:app"), [], num_workers, **kwargs)
+        self.events: list[str] = []
+        self.next_pid = 1
+        self.workers = [self.start_worker(i) for i in range(num_workers)]
+        self.failures = [0] * num_workers
+        self.restart_at = [None] * num_workers
+
+    def start_worker(self, slot: int):
+        process = FakeProcess(self.next_pid, self.events)
+        self.next_pid += 1
+        self.events.append(f"start {process.pid} in slot {slot}")
+        ready = threading.Event()
+        ready.set()
+        return process, ready
+
+
+def test_rolling_restart_replaces_workers_one_at_a_time():
+    supervisor = FakeSupervisor(2, prepare=lambda: True)
+    supervisor.events.clear()
+    supervisor.rolling_restart()
+    assert supervisor.events == ["start 3 in slot 0", "stop 1", "start 4 in slot 1", "stop 2"]
+    assert [process.pid for process, _ in supervisor.workers] == [3, 4]
+
+
+def test_rolling_restart_skipped_if_prepare_fails():
+    supervisor = FakeSupervisor(2, prepare=lambda: False)
+    supervisor.events.clear()
+    supervisor.rolling_restart()
+    assert supervisor.events == []
+
+
+def test_dead_worker_restarted_with_backoff(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    supervisor = FakeSupervisor(2, min_backoff=1, max_backoff=4)
+    supervisor.events.clear()
+
+    for expected_delay in [1, 2, 4, 4]:
+        supervisor.workers[1][0].exitcode = 1
+        supervisor.workers[1][1].clear()
+        supervisor.check_workers()
+        assert supervisor.restart_at[1] == now + expected_delay
+        supervisor.check_workers()
+        assert not supervisor.workers[1][0].is_alive()
+
+        now += expected_delay
+        supervisor.check_workers()
+        assert supervisor.workers[1][0].is_alive()
+        # Not ready yet, so the next exit backs off further.
+        supervisor.workers[1][1].clear()
+        supervisor.check_workers()
+
+    assert supervisor.events == ["start 3 in slot 1", "start 4 in slot 1", "start 5 in slot 1", "start 6 in slot 1"]
+    # Once the worker becomes ready, the delay is reset.
+    supervisor.workers[1][1].set()
+    supervisor.check_workers()
+    assert supervisor.failures[1] == 0
+
+
+@pytest.mark.parametrize("configured, run_maintenance, expected", [
+    (None, True, None),
+    ("false", True, "false"),
+    ("true", True, "true"),
+    ("true", False, "false"),
+])
+def test_run_worker_maintenance(monkeypatch, configured, run_maintenance, expected):
+    """Only the first worker runs maintenance, and only if it isn't disabled."""
+    if configured is None:
+        monkeypatch.delenv("RUN_MAINTENANCE", raising=False)
+    else:
+        monkeypatch.setenv("RUN_MAINTENANCE", configured)
+    monkeypatch.setattr(simple_web_app.__main__.WorkerServer, "run", lambda self, sockets: None)
+    run_worker(uvicorn.Config("simple_web_app.app:app", log_config=None), [], threading.Event(), run_maintenance)
+    assert os.environ.get("RUN_MAINTENANCE") == expected
+
+
+def test_uvicorn_config_from_env(monkeypatch):
+    monkeypatch.setenv("UVICORN_PORT", "9000")
+    monkeypatch.setenv("UVICORN_ROOT_PATH", "/news")
+    monkeypatch.setenv("UVICORN_FORWARDED_ALLOW_IPS", "10.0.0.1")
+    config = uvicorn_config_from_env()
+    assert config.port == 9000
+    assert config.root_path == "/news"
+    assert config.forwarded_allow_ips == "10.0.0.1"
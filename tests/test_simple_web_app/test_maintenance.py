@@ -0,0 +1,104 @@
+import asyncio
+import os
+
+from simple_web_app.db import Database
+from simple_web_app.maintenance import (
+    MaintenanceJob,
+    MaintenanceScheduler,
+    checkpoint_wal,
+    fts_integrity_check,
+    fts_merge,
+    fts_optimize,
+    integrity_check,
+    optimize,
+)
+
+
+async def _search(conn, query: str) -> list[int]:
+    result = await conn.execute("SELECT rowid FROM news_item_fts(?) ORDER BY rowid", [query])
+    return [row[0] for row in await result.fetchall()]
+
+
+async def test_fts_triggers_keep_index_consistent(async_test_client):
+    async with async_test_client as client:
+        async with client.app_state["db"].writer() as conn:
+            await conn.execute("INSERT INTO news_item (id, title, text, published, language) VALUES (1, 'Old title', 'Text.', '2025-08-01', 'english')")
+            await conn.execute("INSERT INTO news_item (id, title, text, published, language) VALUES (2, 'Other', 'Text.', '2025-08-01', 'english')")
+            await conn.execute("UPDATE news_item SET title = 'New title' WHERE id = 1")
+            await conn.execute("DELETE FROM news_item WHERE id = 2")
+
+            assert await _search(conn, "old") == []
+            assert await _search(conn, "new") == [1]
+            assert await _search(conn, "other") == []
+            assert await fts_integrity_check(conn)
+            assert await integrity_check(conn)
+
+
+async def test_fts_merge(async_test_client):
+    async with async_test_client as client:
+        async with client.app_state["db"].writer() as conn:
+            # Merge as soon as there are two segments, rather than the default four.
+            await conn.execute("INSERT INTO news_item_fts(news_item_fts, rank) VALUES ('usermerge', 2)")
+            for i in range(3):
+                await conn.execute("INSERT INTO news_item (title, text, published, language) VALUES (?, 'Text.', '2025-08-01', 'english')", [f"Title {i}"])
+
+            assert await fts_merge(conn, pages=1) > 0
+            assert await fts_merge(conn, pages=1) == 0
+            await fts_optimize(conn)
+            assert await _search(conn, "title") == [1, 2, 3]
+            assert await fts_integrity_check(conn)
+
+
+async def test_checkpoint_wal(tmp_path):
+    database_path = tmp_path / "db.sqlite3"
+    pragmas = ["PRAGMA journal_mode = WAL;", "PRAGMA synchronous = NORMAL;", "PRAGMA busy_timeout = 5000;"]
+    async with Database(database_path, readers=1, pragmas=pragmas) as db:
+        async with db.writer() as conn:
+            await conn.execute("CREATE TABLE t (x TEXT)")
+            await conn.executemany("INSERT INTO t (x) VALUES (?)", [("x" * 1000,)] * 100)
+        wal_size = os.path.getsize(f"{database_path}-wal")
+
+        assert await checkpoint_wal(db, size_threshold=wal_size + 1) == f"WAL is {wal_size} bytes"
+        assert "truncated" in await checkpoint_wal(db, size_threshold=wal_size)
+        assert os.path.getsize(f"{database_path}-wal") == 0
+
+
+async def test_optimize_collects_statistics(async_test_client):
+    async with async_test_client as client:
+        db = client.app_state["db"]
+        async with db.writer() as conn:
+            await conn.executemany(
+                "INSERT INTO news_item (title, text, published, language) VALUES ('Title', 'Text.', '2025-08-01', 'english')",
+                [()] * 10,
+            )
+        await optimize(db)
+        async with db.reader() as conn:
+            result = await conn.execute("SELECT COUNT(*) FROM sqlite_stat1 WHERE tbl = 'news_item'")
+            (count,) = await result.fetchone()
+    assert count > 0
+
+
+async def test_maintenance_scheduler(caplog):
+    runs = []
+
+    async def job():
+        runs.append("job")
+
+    async def failing_job():
+        runs.append("failing_job")
+        raise RuntimeError("Failed")
+
+    scheduler = MaintenanceScheduler([
+        MaintenanceJob("job", 0.01, job),
+        MaintenanceJob("failing_job", 0.01, failing_job),
+        MaintenanceJob("disabled_job", 0, job),
+    ])
+    async with scheduler:
+        assert [job.name for job in scheduler.jobs] == ["job", "failing_job"]
+        tasks = list(scheduler._tasks)
+        await asyncio.sleep(0.1)
+    assert all(task.cancelled() for task in tasks)
+    assert runs.count("job") > 1
+    # A failing job is logged and keeps being scheduled.
+    assert runs.count("failing_job") > 1
+    assert "Maintenance job failing_job failed" in caplog.text
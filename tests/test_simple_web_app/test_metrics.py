@@ -0,0 +1,84 @@
+import os
+import re
+import subprocess
+import sys
+
+from simple_web_app.metrics import MultiProcessRegistry, Registry
+
+
+def _sample(text: str, sample: str) -> float:
+    match = re.search(rf"^{re.escape(sample)} (\S+)$", text, re.MULTILINE)
+    assert match is not None, f"{sample} not in {text}"
+    return float(match.group(1))
+
+
+def test_render():
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests.", ["path"])
+    histogram = registry.histogram("latency_seconds", "Latency.", ["path"], buckets=[0.1, 1.0])
+    registry.callback("pool_size", "Pool size.", "gauge", [], lambda: {(): 4})
+    counter.inc('/"quoted"')
+    counter.inc('/"quoted"', amount=2)
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, "/")
+
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert _sample(text, 'requests_total{path="/\\"quoted\\""}') == 3
+    assert _sample(text, 'latency_seconds_bucket{path="/",le="0.1"}') == 2
+    assert _sample(text, 'latency_seconds_bucket{path="/",le="1.0"}') == 3
+    assert _sample(text, 'latency_seconds_bucket{path="/",le="+Inf"}') == 4
+    assert _sample(text, 'latency_seconds_count{path="/"}') == 4
+    assert _sample(text, 'latency_seconds_sum{path="/"}') == 2.65
+    assert _sample(text, "pool_size") == 4
+
+
+async def test_metrics_endpoint(async_test_client):
+    async with async_test_client as client:
+        before = (await client.get("/metrics")).text
+        await client.get("/", headers={"HX-Request": "true"})
+        await client.get("/static/does-not-exist.css")
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    text = response.text
+    count = 'http_request_duration_seconds_count{method="GET",route="/"}'
+    assert _sample(text, count) == (_sample(before, count) if count in before else 0) + 1
+    assert _sample(text, 'http_responses_total{method="GET",route="/static",status="404"}') >= 1
+    assert _sample(text, 'db_query_duration_seconds_count{query="get_news"}') >= 1
+    assert _sample(text, 'cache_hit_ratio{cache="search_news"}') >= 0
+    assert _sample(text, "db_pool_checkouts_total") >= 1
+
+
+def _worker_registry(directory, pid: int) -> MultiProcessRegistry:
+    registry = MultiProcessRegistry(directory)
+    registry.pid = pid
+    registry.counter("requests_total", "Requests.", ["path"]).inc("/", amount=pid)
+    registry.histogram("latency_seconds", "Latency.", [], buckets=[1.0]).observe(0.5)
+    registry.gauge("in_flight", "In flight.").set(value=pid)
+    return registry
+
+
+def test_multi_process_registry(tmp_path):
+    """Every worker serves the totals of all of them, including the counters of workers which have exited."""
+    running = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    exited = subprocess.Popen([sys.executable, "-c", ""])
+    exited.wait()
+    try:
+        this = _worker_registry(tmp_path, os.getpid())
+        _worker_registry(tmp_path, running.pid).flush()
+        _worker_registry(tmp_path, exited.pid).flush()
+
+        for _ in range(2):
+            text = this.render()
+            assert _sample(text, 'requests_total{path="/"}') == os.getpid() + running.pid + exited.pid
+            assert _sample(text, 'latency_seconds_bucket{le="1.0"}') == 3
+            assert _sample(text, "latency_seconds_count") == 3
+            assert _sample(text, f'in_flight{{worker="{os.getpid()}"}}') == os.getpid()
+            assert _sample(text, f'in_flight{{worker="{running.pid}"}}') == running.pid
+            assert f'worker="{exited.pid}"' not in text
+            assert text.count("# TYPE requests_total counter") == 1
+    finally:
+        running.kill()
+        running.wait()
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == sorted([f"{os.getpid()}.json", f"{running.pid}.json", "archive.json"])
@@ -0,0 +1,111 @@
+import zlib
+
+import brotli
+import pytest
+from starlette.responses import StreamingResponse
+
+from simple_web_app.middleware import CompressionMiddleware, compute_etag, etag_matches, negotiate_encoding
+
+
+def test_etag_matches():
+    etag = compute_etag(b"body")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+
+
+async def test_conditional_get(async_test_client):
+    async with async_test_client as client:
+        response = await client.get("/settings", headers={"HX-Request": "true"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "br"
+        etag = response.headers["etag"]
+        assert etag == f"W/{compute_etag(response.content)}"
+
+        response = await client.get("/settings", headers={"HX-Request": "true", "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert "content-type" not in response.headers
+        assert "content-encoding" not in response.headers
+
+        response = await client.get("/settings", headers={"HX-Request": "true", "If-None-Match": '"stale"'})
+        assert response.status_code == 200
+
+
+async def test_cached_fragment_etag(async_test_client):
+    """Responses from the fragment cache keep the ETag computed when they were stored."""
+    async with async_test_client as client:
+        first = await client.get("/", headers={"HX-Request": "true"})
+        response = await client.get("/", headers={"HX-Request": "true", "If-None-Match": first.headers["etag"]})
+    assert response.status_code == 304
+
+
+async def test_preloaded_cache_control(async_test_client):
+    async with async_test_client as client:
+        preloaded = await client.get("/settings", headers={"HX-Request": "true", "HX-Preloaded": "true"})
+        regular = await client.get("/settings", headers={"HX-Request": "true"})
+    assert preloaded.headers["cache-control"] == "private, max-age=60"
+    assert "cache-control" not in regular.headers
+
+
+async def test_post_has_no_etag(async_test_client):
+    async with async_test_client as client:
+        response = await client.post("/search", data={"search": ""})
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate, br", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("br;q=0, gzip", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("*", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("identity", ["br", "gzip"]) is None
+    assert negotiate_encoding("", ["br", "gzip"]) is None
+
+
+async def test_compression(async_test_client):
+    async with async_test_client as client:
+        for encoding in ["br", "gzip"]:
+            response = await client.get("/", headers={"Accept-Encoding": encoding})
+            assert response.headers["content-encoding"] == encoding
+            assert "<html" in response.text
+            assert response.headers["etag"].startswith("W/")
+
+        response = await client.get("/", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+
+        # Tiny fragments aren't worth compressing
+        response = await client.post("/search", data={"search": ""}, headers={"Accept-Encoding": "br", "HX-Request": "true"})
+        assert "content-encoding" not in response.headers
+
+
+@pytest.mark.parametrize("encoding, decompressor", [("br", brotli.Decompressor), ("gzip", lambda: zlib.decompressobj(16 + zlib.MAX_WBITS))])
+async def test_streamed_compression(encoding, decompressor):
+    chunks = [b"<head>" + b"x" * 1000 + b"</head>", b"<body></body>"]
+
+    async def body():
+        for chunk in chunks:
+            yield chunk
+
+    app = CompressionMiddleware(StreamingResponse(body()), minimum_size=0)
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "GET", "headers": [(b"accept-encoding", encoding.encode())]}
+    await app(scope, receive, send)
+
+    bodies = [m["body"] for m in messages if m["type"] == "http.response.body"]
+    # Each chunk can be decompressed as soon as it arrives.
+    decompress = decompressor()
+    decompressed = [(decompress.process if encoding == "br" else decompress.decompress)(b) for b in bodies]
+    assert decompressed[:2] == chunks
+
@@ -0,0 +1,68 @@
+import jinja2
+import pytest
+from bs4 import BeautifulSoup, Comment
+
+from simple_web_app.minify import minify_html
+
+
+@pytest.mark.parametrize("source, expected", [
+    # Whitespace between inline elements and text renders as a space.
+    ("<p>\n  <strong>a</strong>\n  <em>b</em> c\n</p>\n", "<p><strong>a</strong> <em>b</em> c</p>"),
+    ("<div>\n  <!-- comment -->\n  <span>a</span>\n</div>", "<div><span>a</span></div>"),
+    ("<!--[if IE]><p>IE</p><![endif]-->", "<!--[if IE]><p>IE</p><![endif]-->"),
+    ('<input\n  type="text"\n  placeholder="two  spaces"\n/>', '<input type="text" placeholder="two  spaces"/>'),
+    ("<pre>\n  a\n    b\n</pre>", "<pre>\n  a\n    b\n</pre>"),
+    ("<textarea>\n  a  b\n</textarea>", "<textarea>\n  a  b\n</textarea>"),
+    ("<script>\n  if (a < b) { f('  <!-- x -->  '); }\n</script>", "<script>\n  if (a < b) { f('  <!-- x -->  '); }\n</script>"),
+    ("<em>\n  {{ '<!--  not a comment  -->' }}\n</em>", "<em> {{ '<!--  not a comment  -->' }} </em>"),
+    ('<a\n  {% if x > 1 %}class="a  b"{% endif %}\n>x</a>', '<a {% if x > 1 %}class="a  b"{% endif %}>x</a>'),
+    # Statements render nothing, so whitespace next to them is judged by the markup on their other side.
+    ("<ul>\n  {% for i in items %}\n  <li>{{ i }}</li>\n  {% endfor %}\n</ul>", "<ul>{% for i in items %}<li>{{ i }}</li>{% endfor %}</ul>"),
+])
+def test_minify_html(source, expected):
+    assert minify_html(source) == expected
+
+
+def _normalize(html: str) -> list:
+    """
+    The elements, attributes and text of a document, ignoring comments and the whitespace HTML doesn't render.
+    """
+    nodes = []
+    for node in BeautifulSoup(html, features="html.parser").descendants:
+        if isinstance(node, Comment):
+            continue
+        if isinstance(node, str):
+            if text := " ".join(node.split()):
+                nodes.append(text)
+        else:
+            nodes.append((node.name, sorted(node.attrs.items(), key=lambda item: item[0])))
+    return nodes
+
+
+@pytest.mark.parametrize("method, path, headers, data", [
+    ("GET", "/", {}, None),
+    ("GET", "/", {"HX-Request": "true"}, None),
+    ("GET", "/?category_id=1", {"HX-Request": "true"}, None),
+    ("GET", "/search", {}, None),
+    ("POST", "/search", {"HX-Request": "true"}, {"search": "title"}),
+    ("GET", "/settings", {"HX-Request": "true"}, None),
+    *[("GET", f"/settings/tab?tab={tab}", {"HX-Request": "true"}, None) for tab in ["general", "sections", "content-filter", "syncing", "experimental"]],
+])
+async def test_minified_templates_render_the_same(async_test_client, method, path, headers, data):
+    async with async_test_client as client:
+        async with client.app_state["db"].writer() as conn:
+            await conn.execute("INSERT INTO category (id, name) VALUES (1, 'World')")
+            await conn.executemany(
+                "INSERT INTO news_item (id, title, text, published, language) VALUES (?, 'Title', 'Some  text.', '2025-08-01', 'english')",
+                [(i,) for i in range(1, 8)],
+            )
+            await conn.executemany("INSERT INTO news_item_category (news_item_id, category_id) VALUES (?, 1)", [(i,) for i in range(1, 8)])
+        response = await client.request(method, path, headers=headers, data=data)
+
+    assert response.status_code == 200
+    env = response.template.environment
+    unminified = jinja2.Environment(loader=env.loader, autoescape=True)
+    unminified.globals.update(env.globals)
+    expected = unminified.get_template(response.template.name).render(response.context)
+    assert len(response.text) < len(expected)
+    assert _normalize(response.text) == _normalize(expected)
@@ -0,0 +1,49 @@
+import logging
+
+import aiosql
+import aiosqlite
+
+from simple_web_app.profiling import RequestProfile, current_profile, profile_queries
+
+
+async def test_profile_queries():
+    queries = profile_queries(aiosql.from_str("""
+        -- name: get_values(minimum)
+        SELECT value FROM json_each('[1, 2, 3]') WHERE value >= :minimum;
+    """, "aiosqlite"), explain_threshold=1e-9)
+
+    async with aiosqlite.connect(":memory:") as conn:
+        # Not recorded outside of a request.
+        assert len(await queries.get_values(conn, minimum=2)) == 2
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            await queries.get_values(conn, minimum=2)
+            await queries.get_values(conn, minimum=3)
+        finally:
+            current_profile.reset(token)
+
+    assert [(q.name, q.parameters, q.rows) for q in profile.queries] == [("get_values", {"minimum": 2}, 2), ("get_values", {"minimum": 3}, 1)]
+    assert all(q.plan for q in profile.queries)
+    assert profile.repeated_queries(1) == {"get_values": 2}
+    assert profile.server_timing().startswith('db;dur=') and "get_values;dur=" in profile.server_timing()
+
+
+async def test_profiling_middleware(async_test_client, monkeypatch, caplog):
+    import simple_web_app.app
+
+    monkeypatch.setattr(simple_web_app.app, "FRAGMENT_CACHE_TTL", 0)
+    monkeypatch.setattr(simple_web_app.app, "BATCH_CATEGORY_LOOKUP", False)
+    async with async_test_client as client:
+        async with client.app_state["db"].writer() as conn:
+            await conn.executemany(
+                "INSERT INTO news_item (id, title, text, published, language) VALUES (?, 'Title', 'Text.', '2025-08-01', 'english')",
+                [(i,) for i in range(1, 6)],
+            )
+        with caplog.at_level(logging.INFO, logger="simple_web_app.middleware"):
+            response = await client.get("/", headers={"HX-Request": "true"})
+
+    assert "get_news;dur=" in response.headers["server-timing"]
+    assert "GET /: " in caplog.text
+    assert "get_categories_for_news ran 5 times" in caplog.text
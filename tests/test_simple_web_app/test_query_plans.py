@@ -0,0 +1,32 @@
+import importlib.resources
+import re
+
+import aiosql
+import pytest
+
+QUERY_DIR = importlib.resources.files("simple_web_app").joinpath("queries")
+queries_basic = aiosql.from_path(QUERY_DIR / "basic.sql", "aiosqlite")
+
+# Queries which are allowed to fully scan a (non-virtual) table, along with the reason why.
+ALLOWED_SCANS = {
+    "get_categories": "category is a small reference table read in rowid order up to a LIMIT",
+}
+
+
+def _query_names() -> list[str]:
+    return [name for name in queries_basic.available_queries if not name.endswith("_cursor")]
+
+
+@pytest.mark.parametrize("query_name", _query_names())
+async def test_query_plan(async_test_client, query_name):
+    sql = getattr(queries_basic, query_name).sql
+    params = {name: None for name in re.findall(r":(\w+)", sql)}
+    async with async_test_client as client:
+        async with client.app_state["db"].reader() as conn:
+            result = await conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = [row["detail"] for row in await result.fetchall()]
+
+    assert not any("USE TEMP B-TREE FOR ORDER BY" in detail for detail in plan), plan
+    if query_name not in ALLOWED_SCANS:
+        table_scans = [d for d in plan if d.startswith("SCAN ") and "VIRTUAL TABLE" not in d]
+        assert not table_scans, plan
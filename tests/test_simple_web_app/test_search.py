@@ -0,0 +1,42 @@
+import pytest
+
+from simple_web_app.search import MATCH_END, MATCH_START, build_match_query, mark_matches
+
+
+@pytest.mark.parametrize(("user_input", "expected"), [
+    ("climate", '"climate"*'),
+    ("climate change ", '"climate" "change"'),
+    ('climate "chan', '"climate" "chan"*'),
+    ("NOT AND OR", '"not" "and" "or"*'),
+    ("title:x* c", '"title" "x" "c"'),
+    ('"', ""),
+    ("", ""),
+])
+def test_build_match_query(user_input, expected):
+    assert build_match_query(user_input) == expected
+
+
+def test_mark_matches_escapes_text():
+    marked = mark_matches(f"<b>{MATCH_START}news{MATCH_END}</b>")
+    assert marked == "&lt;b&gt;<mark>news</mark>&lt;/b&gt;"
+
+
+async def test_search_ranking_and_highlighting(async_test_client):
+    async with async_test_client as client:
+        async with client.app_state["db"].writer() as conn:
+            await conn.executemany(
+                "INSERT INTO news_item (id, title, text, published, language) VALUES (?, ?, ?, '2025-08-01', 'english')",
+                [
+                    (1, "Weather report", "Climate scientists say " + "lorem ipsum " * 50 + "the end."),
+                    (2, "Climate summit opens", "Leaders meet."),
+                    (3, "Sports", "Nothing to see here."),
+                ],
+            )
+        response = await client.post("/search", data={"search": 'clim "'}, headers={"HX-Request": "true"})
+
+    assert response.status_code == 200
+    news = response.context["news"]
+    assert [n["id"] for n in news] == [2, 1]
+    assert news[0]["title"] == "<mark>Climate</mark> summit opens"
+    assert news[1]["snippet"].startswith("<mark>Climate</mark> scientists say")
+    assert len(news[1]["snippet"]) < 300
@@ -0,0 +1,65 @@
+import re
+
+import httpx
+from bs4 import BeautifulSoup
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from simple_web_app.static import IMMUTABLE_CACHE_CONTROL, FingerprintedStaticFiles, PrecompressedStaticFiles, precompress_directory
+
+
+async def test_precompressed_static_files(tmp_path):
+    (tmp_path / "style.css").write_text("body { color: red; }\n" * 100)
+    (tmp_path / "tiny.css").write_text("a {}")
+    assert precompress_directory(tmp_path) == 2
+    assert precompress_directory(tmp_path) == 0  # Sidecars are up to date
+    assert not (tmp_path / "tiny.css.br").exists()
+
+    app = Starlette(routes=[Mount("/static", PrecompressedStaticFiles(directory=tmp_path))])
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        for encoding in ["br", "gzip"]:
+            response = await client.get("/static/style.css", headers={"Accept-Encoding": encoding})
+            assert response.headers["content-encoding"] == encoding
+            assert response.headers["content-type"].startswith("text/css")
+            assert response.text == (tmp_path / "style.css").read_text()
+
+        response = await client.get("/static/style.css", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+
+
+async def test_fingerprinted_static_files(tmp_path):
+    (tmp_path / "style.css").write_text("body { color: red; }\n" * 100)
+    precompress_directory(tmp_path)
+    static_files = FingerprintedStaticFiles(directory=tmp_path)
+    static_files.fingerprint()
+    assert list(static_files.fingerprints) == ["style.css"]  # Sidecars aren't fingerprinted
+    path = static_files.url_path("style.css")
+    assert re.fullmatch(r"style\.[0-9a-f]{12}\.css", path)
+    assert static_files.url_path("missing.css") == "missing.css"
+
+    app = Starlette(routes=[Mount("/static", static_files)])
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        response = await client.get(f"/static/{path}", headers={"Accept-Encoding": "br"})
+        assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert response.headers["content-encoding"] == "br"
+        assert response.text == (tmp_path / "style.css").read_text()
+
+        response = await client.get("/static/style.css")
+        assert response.status_code == 200
+        assert "cache-control" not in response.headers
+
+        (tmp_path / "style.css").write_text("body { color: blue; }")
+        static_files.fingerprint()
+        assert static_files.url_path("style.css") != path
+
+
+async def test_stylesheet_is_fingerprinted(async_test_client):
+    async with async_test_client as client:
+        response = await client.get("/")
+        soup = BeautifulSoup(response.text, features="html.parser")
+        href = soup.find("link", {"rel": "stylesheet"})["href"]
+        assert re.fullmatch(r"/static/style\.[0-9a-f]{12}\.css", href)
+        response = await client.get(href)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL